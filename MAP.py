@@ -3,11 +3,14 @@ import folium
 from streamlit_folium import st_folium
 from streamlit_echarts import st_echarts
 import json
-import pandas as pd
 import google.generativeai as genai
 import os
 from modules.updater import check_missing_periods
-from modules.real_estate_merger_pro import main as process_season
+from modules.real_estate_merger_pro import build_season, push_outputs
+from modules.season_store import sync_from_csv, DatasetCache, SelectionIndex, season_partition_path, store_fingerprint, load_seasons, SKETCH_ROOT
+from modules.quantile_sketch import quantile_rollup
+from modules.price_cube import PriceCube, BUILD_TYPES
+from modules.price_overlay import ensure_season_geojson
 
 
 st.set_page_config(page_title="台灣不動產分析與 Gemini 對話", layout="wide")
@@ -70,6 +73,7 @@ with st.sidebar:
                     
                     success_count = 0
                     failed_periods = []
+                    outputs = {}
                     
                     # 自動下載與處理缺失期數
                     for i, period in enumerate(missing):
@@ -77,13 +81,22 @@ with st.sidebar:
                         progress_bar.progress((i) / len(missing))
                         
                         try:
-                            process_season(period)
+                            output_file = build_season(period)
+                            if output_file is None:
+                                raise RuntimeError("資料處理失敗")
+                            outputs[period] = output_file
                             success_count += 1
                             st.success(f"✅ 完成期數 {period} 的資料更新")
                         except Exception as e:
                             failed_periods.append(period)
                             st.error(f"❌ 期數 {period} 更新失敗: {str(e)}")
                     
+                    # 所有期數處理完後，以單一 commit 發佈到 GitHub
+                    if outputs:
+                        status_text.text("正在發佈到 GitHub...")
+                        if not push_outputs(list(outputs.values()), list(outputs.keys())):
+                            st.warning("⚠️ 發佈到 GitHub 失敗，統計檔已保存在本地")
+                    
                     # 完成進度條
                     progress_bar.progress(1.0)
                     status_text.text("更新完成！")
@@ -150,23 +163,53 @@ city_coords = {
     "台東縣": [22.7583, 121.1500],
 }
 
-with open("district_coords.json", "r", encoding="utf-8") as f:
-    district_coords = json.load(f)
+DISPLAY_COLUMNS = ["縣市", "行政區", "BUILD", "平均單價元平方公尺", "交易筆數", "季度"]
+
+@st.cache_data
+def load_district_coords(path, mtime):
+    # mtime 只用來讓檔案更新後快取失效
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+@st.cache_resource
+def get_dataset_cache():
+    # 整個行程（所有使用者、每次重跑）共用同一份資料快取
+    return DatasetCache(columns=DISPLAY_COLUMNS + ["year", "quarter"])
+
+@st.cache_resource(max_entries=1)
+def get_selection_index(version, _df):
+    return SelectionIndex(_df)
+
+@st.cache_resource(max_entries=1)
+def get_price_cube(version, _df):
+    # 每個資料版本只建立一次；_df 不參與快取鍵的雜湊
+    return PriceCube(_df)
+
+@st.cache_resource(max_entries=1)
+def get_sketches(fingerprint):
+    # 分位數草圖只在有新期數寫入時重新讀取
+    return load_seasons(SKETCH_ROOT) if fingerprint else None
+
+district_coords = load_district_coords("district_coords.json", os.path.getmtime("district_coords.json"))
 
 folder = "./"
-file_names = [f for f in os.listdir(folder) if f.startswith("合併後不動產統計_") and f.endswith(".csv")]
-dfs = []
-for file in file_names:
-    try:
-        df = pd.read_csv(os.path.join(folder, file))
-        dfs.append(df)
-    except Exception as e:
-        print(f"讀取 {file} 失敗：{e}")
-combined_df = pd.concat(dfs, ignore_index=True) if dfs else pd.DataFrame()
+# 只把新增或更新過的 CSV 匯入分區資料集，快取只會讀取有變動的期數
+sync_from_csv(folder)
+dataset_cache = get_dataset_cache()
+combined_df = dataset_cache.get()
+selection_index = get_selection_index(dataset_cache.version, combined_df)
+sketches = get_sketches(tuple(sorted(store_fingerprint(SKETCH_ROOT).items())))
+price_cube = get_price_cube(dataset_cache.version, combined_df) if len(combined_df) > 0 else None
 
 st.title("台灣地圖與不動產資料分析")
 
 chart_type = st.sidebar.selectbox("選擇圖表類型", ["不動產價格趨勢分析", "交易筆數分布"])
+season_keys = sorted(combined_df["season_key"].unique().tolist(), reverse=True) if len(combined_df) > 0 else []
+overlay_season = st.sidebar.selectbox(
+    "行政區價格圖層",
+    [None] + season_keys,
+    format_func=lambda k: "不顯示" if k is None else f"{k // 100}年第{'一二三四'[k % 100 - 1]}季",
+)
 col1, col2 = st.columns([3, 1])
 
 with col2:
@@ -197,7 +240,65 @@ with col2:
             st.session_state.show_filtered_data = False
 
 with col1:
+    # 地圖與圖層每次重跑都重新建立：st_folium 會把 feature_group_to_add 加到傳入的地圖上，
+    # 快取的 folium 物件會被各使用者的圖層汙染，所以只快取資料（座標、GeoJSON）。
+    # st_folium 產生 HTML 時會把元素 id 正規化，底圖內容相同時前端不會重新載入。
+    def build_base_map():
+        m = folium.Map(location=[23.7, 121], zoom_start=7)
+        city_layer = folium.FeatureGroup(name="縣市")
+        for city, coord in city_coords.items():
+            folium.Marker(
+                location=coord,
+                popup=city,
+                tooltip=f"點擊選擇 {city}",
+                icon=folium.Icon(color="blue", icon="info-sign"),
+            ).add_to(city_layer)
+        city_layer.add_to(m)
+        return m
+
+    def build_district_layer(city):
+        layer = folium.FeatureGroup(name=f"{city}行政區")
+        for district, coord in district_coords.get(city, {}).items():
+            folium.Marker(
+                location=coord,
+                popup=district,
+                icon=folium.Icon(color="green", icon="home"),
+            ).add_to(layer)
+        return layer
+
+    # 價格級距 0（最便宜）到 4（最貴）的顏色
+    PRICE_CLASS_COLORS = ["#2c7bb6", "#abd9e9", "#ffffbf", "#fdae61", "#d7191c"]
+
+    @st.cache_data
+    def load_price_geojson(path, mtime):
+        # mtime 只用來讓檔案更新後快取失效
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def build_price_layer(collection):
+        # 整期的行政區價格是一個 GeoJSON 圖層，不是數百個各自的標記
+        layer = folium.FeatureGroup(name="行政區價格")
+        folium.GeoJson(
+            collection,
+            marker=folium.CircleMarker(fill=True, fill_opacity=0.7, weight=1),
+            style_function=lambda feature: {
+                "radius": 4 + min(feature["properties"]["交易筆數"], 2500) ** 0.5 / 3,
+                "fillColor": PRICE_CLASS_COLORS[feature["properties"]["價格級距"]],
+                "color": "#555555",
+            },
+            tooltip=folium.GeoJsonTooltip(fields=["縣市", "行政區", "平均單價元平方公尺", "交易筆數"]),
+        ).add_to(layer)
+        return layer
+
+    def create_price_layer(season_key):
+        season_code = f"{season_key:05d}"
+        season_df = combined_df[combined_df["season_key"] == season_key]
+        source_mtime = os.path.getmtime(season_partition_path(season_code))
+        path = ensure_season_geojson(season_code, season_df, source_mtime)
+        return build_price_layer(load_price_geojson(path, os.path.getmtime(path)))
+
     def create_map(selected_city=None, selected_district=None):
+        """回傳 (中心點, 縮放層級, 這次要疊加的圖層)；只有選取的標記會每次重建"""
         if selected_city and selected_district and selected_district in district_coords.get(selected_city, {}):
             zoom_loc = district_coords[selected_city][selected_district]
             zoom_level = 14
@@ -205,40 +306,62 @@ with col1:
             zoom_loc = city_coords.get(selected_city, [23.7, 121])
             zoom_level = 12 if selected_city else 7
 
-        m = folium.Map(location=zoom_loc, zoom_start=zoom_level)
-
-        for city, coord in city_coords.items():
-            folium.Marker(
-                location=coord,
-                popup=city,
-                tooltip=f"點擊選擇 {city}",
-                icon=folium.Icon(color="red" if city == selected_city else "blue", icon="info-sign"),
-            ).add_to(m)
-
+        layers = []
+        if overlay_season is not None:
+            layers.append(create_price_layer(overlay_season))
         if selected_city and selected_city in district_coords:
-            for district, coord in district_coords[selected_city].items():
-                color = "orange" if district == selected_district else "green"
-                folium.Marker(
-                    location=coord,
-                    popup=district,
-                    icon=folium.Icon(color=color, icon="home"),
-                ).add_to(m)
-
-        return m
+            layers.append(build_district_layer(selected_city))
 
-    map_data = create_map(st.session_state.selected_city, st.session_state.selected_district)
-    st_folium(map_data, width=800, height=600)
+        highlight = folium.FeatureGroup(name="選取")
+        if selected_city in city_coords:
+            folium.Marker(
+                location=city_coords[selected_city],
+                popup=selected_city,
+                tooltip=f"點擊選擇 {selected_city}",
+                icon=folium.Icon(color="red", icon="info-sign"),
+            ).add_to(highlight)
+        if selected_district and selected_district in district_coords.get(selected_city, {}):
+            folium.Marker(
+                location=district_coords[selected_city][selected_district],
+                popup=selected_district,
+                icon=folium.Icon(color="orange", icon="home"),
+            ).add_to(highlight)
+        layers.append(highlight)
+
+        return zoom_loc, zoom_level, layers
+
+    zoom_loc, zoom_level, map_layers = create_map(st.session_state.selected_city, st.session_state.selected_district)
+    # 底圖內容固定不變，只有中心點、縮放與動態圖層隨選擇改變
+    st_folium(
+        build_base_map(),
+        center=zoom_loc,
+        zoom=zoom_level,
+        feature_group_to_add=map_layers,
+        key="taiwan_map",
+        width=800,
+        height=600,
+    )
 
     if st.session_state.show_filtered_data:
-        filtered_df = combined_df.copy()
-        if st.session_state.selected_city:
-            filtered_df = filtered_df[filtered_df["縣市"] == st.session_state.selected_city]
-        if st.session_state.selected_district:
-            filtered_df = filtered_df[filtered_df["行政區"] == st.session_state.selected_district]
+        # 從選取索引直接取出對應的連續區段，不複製整個資料表
+        filtered_df = selection_index.select(st.session_state.selected_city, st.session_state.selected_district)
 
         st.markdown("## 📊 篩選後的不動產資料")
         st.write(f"共 {len(filtered_df)} 筆資料")
-        st.dataframe(filtered_df)
+        st.dataframe(filtered_df[DISPLAY_COLUMNS])
+
+        if sketches is not None:
+            # 合併所選範圍內各季、各行政區的草圖，估計每年的單價分位數
+            selected = sketches
+            if st.session_state.selected_city:
+                selected = selected[selected["縣市"] == st.session_state.selected_city]
+            if st.session_state.selected_district:
+                selected = selected[selected["行政區"] == st.session_state.selected_district]
+            if len(selected) > 0:
+                quantiles = quantile_rollup(selected, by=["year", "BUILD"])
+                quantiles["year"] = quantiles["year"] + 1911
+                st.markdown("### 單價分位數（元/平方公尺，p50 為中位數）")
+                st.dataframe(quantiles.rename(columns={"year": "年份"}), hide_index=True)
 
         topic_title = f"{st.session_state.selected_city or '全台'} - {chart_type}"
 
@@ -254,34 +377,29 @@ with col1:
             st.session_state.previous_topic_title = topic_title
 
         if chart_type == "不動產價格趨勢分析" and len(filtered_df) > 0:
-            filtered_df['年份'] = filtered_df['季度'].str[:3].astype(int) + 1911
-            yearly_avg = filtered_df.groupby(['年份', 'BUILD'])['平均單價元平方公尺'].mean().reset_index()
-            years = sorted(yearly_avg['年份'].unique())
-            year_labels = [str(year) for year in years]
-            new_house_data = [int(yearly_avg[(yearly_avg['年份'] == y) & (yearly_avg['BUILD'] == '新成屋')]['平均單價元平方公尺'].values[0]) if not yearly_avg[(yearly_avg['年份'] == y) & (yearly_avg['BUILD'] == '新成屋')].empty else 0 for y in years]
-            old_house_data = [int(yearly_avg[(yearly_avg['年份'] == y) & (yearly_avg['BUILD'] == '中古屋')]['平均單價元平方公尺'].values[0]) if not yearly_avg[(yearly_avg['年份'] == y) & (yearly_avg['BUILD'] == '中古屋')].empty else 0 for y in years]
+            # 從價格立方體取出各 BUILD 類別對齊到同一組年份的加權平均單價
+            year_labels, build_series = price_cube.trend_series(
+                st.session_state.selected_city, st.session_state.selected_district
+            )
 
             options = {
                 "title": {"text": "不動產價格趨勢分析"},
                 "tooltip": {"trigger": "axis"},
-                "legend": {"data": ["新成屋", "中古屋"]},
+                "legend": {"data": BUILD_TYPES},
                 "xAxis": {"type": "category", "data": year_labels},
                 "yAxis": {"type": "value"},
                 "series": [
-                    {"name": "新成屋", "type": "line", "data": new_house_data},
-                    {"name": "中古屋", "type": "line", "data": old_house_data},
+                    {"name": build, "type": "line", "data": data}
+                    for build, data in build_series.items()
                 ]
             }
             st_echarts(options, height="400px")
 
         elif chart_type == "交易筆數分布" and len(filtered_df) > 0:
-            group_column = "縣市" if st.session_state.selected_city is None else "行政區"
-            if group_column in filtered_df.columns:
-                if '交易筆數' in filtered_df.columns:
-                    counts = filtered_df.groupby(group_column)['交易筆數'].sum().reset_index()
-                else:
-                    counts = filtered_df.groupby(group_column).size().reset_index(name='交易筆數')
-                pie_data = [{"value": int(row["交易筆數"]), "name": row[group_column]} for _, row in counts.iterrows()]
+            if price_cube is not None:
+                # 全台時依縣市、選了縣市時依行政區，從價格立方體取出總筆數
+                counts = price_cube.counts_by_child(st.session_state.selected_city, st.session_state.selected_district)
+                pie_data = [{"value": int(value), "name": name} for name, value in counts.items()]
                 pie_data = sorted(pie_data, key=lambda x: x['value'], reverse=True)[:10]
                 options = {
                     "title": {"text": "交易筆數分布", "left": "center"},
@@ -299,7 +417,7 @@ with col1:
         if st.session_state.api_key:
             genai.configure(api_key=st.session_state.api_key)
             model = genai.GenerativeModel("models/gemini-2.0-flash")
-            sample_text = filtered_df.head(1000).to_csv(index=False)
+            sample_text = filtered_df[DISPLAY_COLUMNS].head(1000).to_csv(index=False)
 
             with st.form(key="gemini_chat_form", clear_on_submit=True):
                 user_input = st.text_input("🗣️ 請問 Gemini：", placeholder="請輸入問題...")
@@ -1,6 +1,8 @@
 import streamlit as st
-import requests
-import math
+from modules import http_client
+from modules.geo_cache import get_geo_cache, geocode_key, place_key, GEOCODE_TTL, PLACES_TTL
+from modules.places import merge_places
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from streamlit.components.v1 import html
 
 st.title("地址周邊查詢（多類別按鈕 + 彩色標記 + 關鍵字顏色）")
@@ -58,14 +60,38 @@ if keyword:
     )
 
 # ====== 工具函數 ======
-def haversine(lat1, lon1, lat2, lon2):
-    R = 6371000
-    phi1, phi2 = math.radians(lat1), math.radians(lat2)
-    d_phi = math.radians(lat2 - lat1)
-    d_lambda = math.radians(lon2 - lon1)
-    a = math.sin(d_phi/2)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(d_lambda/2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return R * c
+NEARBY_SEARCH_URL = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
+# 同時送出的 Nearby Search 請求上限
+MAX_QUERY_WORKERS = 8
+
+geo_cache = get_geo_cache()
+
+def geocode(address):
+    def fetch():
+        geo_url = "https://maps.googleapis.com/maps/api/geocode/json"
+        geo_res = http_client.get(geo_url, params={"address": address, "key": google_api_key, "language": "zh-TW"}).json()
+        if geo_res.get("status") != "OK":
+            return None
+        # 與 NNNNN.py 共用同一個快取鍵，統一存成 [lat, lng]
+        location = geo_res["results"][0]["geometry"]["location"]
+        return [location["lat"], location["lng"]]
+    return geo_cache.get_or_fetch(geocode_key("google", address), fetch, GEOCODE_TTL)
+
+def nearby_search(lat, lng, kw):
+    def fetch():
+        params = {
+            "location": f"{lat},{lng}",
+            "radius": radius,
+            "keyword": kw,
+            "key": google_api_key,
+            "language": "zh-TW"
+        }
+        res = http_client.get(NEARBY_SEARCH_URL, params=params).json()
+        # 只快取成功的查詢（包含查無結果），金鑰錯誤或超過配額時下次重查
+        if res.get("status") not in ("OK", "ZERO_RESULTS"):
+            return None
+        return res.get("results", [])
+    return geo_cache.get_or_fetch(place_key("google", lat, lng, radius, kw), fetch, PLACES_TTL) or []
 
 def search_places():
     if not google_api_key:
@@ -78,77 +104,78 @@ def search_places():
         st.error("請至少選擇一個大類別或輸入關鍵字")
         return
 
-    geo_url = "https://maps.googleapis.com/maps/api/geocode/json"
-    geo_res = requests.get(geo_url, params={"address": address, "key": google_api_key, "language": "zh-TW"}).json()
-    if geo_res.get("status") != "OK":
+    location = geocode(address)
+    if location is None:
         st.error("無法解析該地址")
         return
 
-    lat, lng = geo_res["results"][0]["geometry"]["location"].values()
-    all_places = []
-
-    # 1️⃣ 大類別搜尋
-    for cat in selected_categories:
-        for kw in PLACE_TYPES[cat]:
-            params = {
-                "location": f"{lat},{lng}",
-                "radius": radius,
-                "keyword": kw,
-                "key": google_api_key,
-                "language": "zh-TW"
-            }
-            res = requests.get("https://maps.googleapis.com/maps/api/place/nearbysearch/json", params=params).json()
-            for p in res.get("results", []):
-                p_lat = p["geometry"]["location"]["lat"]
-                p_lng = p["geometry"]["location"]["lng"]
-                dist = int(haversine(lat, lng, p_lat, p_lng))
-                if dist <= radius:
-                    all_places.append((cat, kw, p.get("name", "未命名"), p_lat, p_lng, dist, p.get("place_id", "")))
-
-    # 2️⃣ 單純關鍵字搜尋（不管是否有選大類別）
-    if keyword:
-        params = {
-            "location": f"{lat},{lng}",
-            "radius": radius,
-            "keyword": keyword,
-            "key": google_api_key,
-            "language": "zh-TW"
-        }
-        res = requests.get("https://maps.googleapis.com/maps/api/place/nearbysearch/json", params=params).json()
-        for p in res.get("results", []):
-            p_lat = p["geometry"]["location"]["lat"]
-            p_lng = p["geometry"]["location"]["lng"]
-            dist = int(haversine(lat, lng, p_lat, p_lng))
-            if dist <= radius:
-                all_places.append(("關鍵字", keyword, p.get("name", "未命名"), p_lat, p_lng, dist, p.get("place_id", "")))
+    lat, lng = location
 
-    all_places.sort(key=lambda x: x[5])
+    # 1️⃣ 大類別的每個子關鍵字 + 2️⃣ 單純關鍵字搜尋（不管是否有選大類別）
+    queries = [(cat, kw) for cat in selected_categories for kw in PLACE_TYPES[cat]]
+    if keyword:
+        queries.append(("關鍵字", keyword))
+
+    # 所有查詢同時送出，先回來的先合併並更新畫面
+    # 依查詢順序合併，距離相同時排序結果與逐一查詢時一致；同一地點（place_id）只留一筆
+    def merged(found):
+        return merge_places([(*queries[i], found[i]) for i in sorted(found)], lat, lng, radius)
+
+    found = {}
+    progress = st.progress(0.0, text=f"查詢中…（0/{len(queries)}）")
+    live = st.empty()
+    with ThreadPoolExecutor(max_workers=min(MAX_QUERY_WORKERS, len(queries))) as executor:
+        futures = {executor.submit(nearby_search, lat, lng, kw): i for i, (cat, kw) in enumerate(queries)}
+        for done, future in enumerate(as_completed(futures), 1):
+            i = futures[future]
+            cat, kw = queries[i]
+            try:
+                found[i] = future.result()
+            except Exception as e:
+                st.warning(f"「{kw}」查詢失敗：{e}")
+                found[i] = []
+
+            progress.progress(done / len(queries), text=f"查詢中…（{done}/{len(queries)}）")
+            partial = merged(found)
+            live.markdown("\n".join(
+                [f"目前找到 {len(partial)} 個地點"] +
+                [f"- **[{'/'.join(p.categories)}]** {'、'.join(p.keywords)} - {p.name} ({p.dist} 公尺)"
+                 for p in partial.head(10).itertuples()]
+            ))
+    progress.empty()
+    live.empty()
+
+    places = merged(found)
 
     st.write(f"目前搜尋半徑：{radius} 公尺")
+    stats = geo_cache.stats()
+    st.caption(f"查詢快取：命中 {stats['hits']} 次、未命中 {stats['misses']} 次（共 {stats['entries']} 筆）")
     st.subheader("查詢結果")
-    if not all_places:
+    if places.empty:
         st.write("範圍內無符合地點。")
         return
 
-    for cat, kw, name, _, _, dist, _ in all_places:
-        st.write(f"**[{cat}]** {kw} - {name} ({dist} 公尺)")
+    for p in places.itertuples():
+        st.write(f"**[{'/'.join(p.categories)}]** {'、'.join(p.keywords)} - {p.name} ({p.dist} 公尺)")
 
     st.sidebar.subheader("Google 地圖連結")
-    for cat, kw, name, _, _, dist, pid in all_places:
-        if pid:
-            st.sidebar.markdown(f"- [{name} ({dist}m)](https://www.google.com/maps/place/?q=place_id:{pid})")
+    for p in places.itertuples():
+        if p.place_id:
+            st.sidebar.markdown(f"- [{p.name} ({p.dist}m)](https://www.google.com/maps/place/?q=place_id:{p.place_id})")
 
     # ====== 地圖標記 ======
+    # 每個地點一個標記，顏色取第一個符合的類別
     markers_js = ""
-    for cat, kw, name, p_lat, p_lng, dist, pid in all_places:
-        color = CATEGORY_COLORS.get(cat, "#000000")
-        gmap_url = f"https://www.google.com/maps/place/?q=place_id:{pid}" if pid else ""
-        info = f'{cat}-{kw}: <a href="{gmap_url}" target="_blank">{name}</a><br>距離中心 {dist} 公尺'
+    for p in places.itertuples():
+        cat = "/".join(p.categories)
+        color = CATEGORY_COLORS.get(p.categories[0], "#000000")
+        gmap_url = f"https://www.google.com/maps/place/?q=place_id:{p.place_id}" if p.place_id else ""
+        info = f'{cat}-{"、".join(p.keywords)}: <a href="{gmap_url}" target="_blank">{p.name}</a><br>距離中心 {p.dist} 公尺'
         markers_js += f"""
         new google.maps.Marker({{
-            position: {{lat: {p_lat}, lng: {p_lng}}},
+            position: {{lat: {p.lat}, lng: {p.lng}}},
             map: map,
-            title: "{cat}-{name}",
+            title: "{cat}-{p.name}",
             icon: {{
                 path: google.maps.SymbolPath.CIRCLE,
                 scale: 7,
@@ -1,11 +1,14 @@
 import streamlit as st
-import requests
-import math
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from modules import http_client
+from modules.geo_cache import get_geo_cache, geocode_key, place_key, GEOCODE_TTL, PLACES_TTL
+from modules.places import merge_places, category_counts, plan_query_groups
 import folium
 from streamlit.components.v1 import html
 import google.generativeai as genai
 
-st.title("🏠 房屋比較 + Google Places 雙地圖 + Gemini 分析 + 關鍵字搜尋")
+st.title("🏠 多間房屋比較 + Google Places 地圖 + Gemini 分析 + 關鍵字搜尋")
 
 # ===============================
 # 大類別對應關鍵字
@@ -27,87 +30,134 @@ CATEGORY_COLORS = {
     "關鍵字": "#000000"
 }
 
+# 一次比較的房屋數上限，與各房屋在地圖上的顏色
+MAX_HOUSES = 10
+HOUSE_COLORS = ["red", "blue", "green", "purple", "orange", "darkred", "cadetblue", "darkgreen", "pink", "gray"]
+# 同時送出的 Nearby Search 請求上限
+MAX_QUERY_WORKERS = 8
+# Nearby Search 單頁最多 20 筆（依知名度排序）
+NEARBY_SEARCH_PAGE_SIZE = 20
+
 # ===============================
 # 工具函式
 # ===============================
-def geocode_address(address: str, api_key: str):
-    url = "https://maps.googleapis.com/maps/api/geocode/json"
-    params = {"address": address, "key": api_key, "language": "zh-TW"}
-    r = requests.get(url, params=params, timeout=10).json()
-    if r.get("status") == "OK" and r["results"]:
-        loc = r["results"][0]["geometry"]["location"]
-        return loc["lat"], loc["lng"]
-    return None, None
-
-def haversine(lat1, lon1, lat2, lon2):
-    R = 6371000
-    phi1, phi2 = math.radians(lat1), math.radians(lat2)
-    d_phi = math.radians(lat2 - lat1)
-    d_lambda = math.radians(lon2 - lon1)
-    a = math.sin(d_phi/2)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(d_lambda/2)**2
-    return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-
-def query_by_keyword(lat, lng, api_key, selected_categories, keyword="", radius=500):
-    results = {cat: [] for cat in selected_categories}
-    if keyword and not selected_categories:
-        results["關鍵字"] = []
+NEARBY_SEARCH_URL = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
 
-    for cat in selected_categories:
-        for kw in CATEGORY_KEYWORDS[cat]:
-            search_kw = f"{kw} {keyword}" if keyword else kw
-            params = {
-                "location": f"{lat},{lng}",
-                "radius": radius,
-                "keyword": search_kw,
-                "key": api_key,
-                "language": "zh-TW"
-            }
-            r = requests.get("https://maps.googleapis.com/maps/api/place/nearbysearch/json", params=params).json()
-            for place in r.get("results", []):
-                p_lat = place["geometry"]["location"]["lat"]
-                p_lng = place["geometry"]["location"]["lng"]
-                dist = int(haversine(lat, lng, p_lat, p_lng))
-                results[cat].append((place.get("name", "未命名"), p_lat, p_lng, dist))
+geo_cache = get_geo_cache()
 
-    if keyword and not selected_categories:
+def geocode_address(address: str, api_key: str):
+    def fetch():
+        url = "https://maps.googleapis.com/maps/api/geocode/json"
+        params = {"address": address, "key": api_key, "language": "zh-TW"}
+        r = http_client.get(url, params=params, timeout=10).json()
+        if r.get("status") == "OK" and r["results"]:
+            loc = r["results"][0]["geometry"]["location"]
+            return [loc["lat"], loc["lng"]]
+        return None
+    loc = geo_cache.get_or_fetch(geocode_key("google", address), fetch, GEOCODE_TTL)
+    return tuple(loc) if loc else (None, None)
+
+def nearby_search(lat, lng, api_key, search_kw, radius):
+    def fetch():
         params = {
             "location": f"{lat},{lng}",
             "radius": radius,
-            "keyword": keyword,
+            "keyword": search_kw,
             "key": api_key,
             "language": "zh-TW"
         }
-        r = requests.get("https://maps.googleapis.com/maps/api/place/nearbysearch/json", params=params).json()
-        for place in r.get("results", []):
-            p_lat = place["geometry"]["location"]["lat"]
-            p_lng = place["geometry"]["location"]["lng"]
-            dist = int(haversine(lat, lng, p_lat, p_lng))
-            results["關鍵字"].append((place.get("name", "未命名"), p_lat, p_lng, dist))
-    return results
-
-def add_markers(m, info_dict):
-    for category, places in info_dict.items():
-        color = CATEGORY_COLORS.get(category, "#000000")
-        for name, lat, lng, dist in places:
-            folium.Marker(
-                [lat, lng],
-                popup=f"{category}：{name}（{dist} 公尺）",
-                icon=folium.Icon(color="blue", icon="info-sign")
-            ).add_to(m)
-            folium.CircleMarker(
-                location=[lat, lng],
-                radius=6,
-                color=color,
-                fill=True,
-                fill_opacity=0.8
-            ).add_to(m)
-
-def format_info(address, info_dict):
-    lines = [f"房屋（{address}）："]
-    for k, v in info_dict.items():
-        lines.append(f"- {k}: {len(v)} 個")
+        r = http_client.get(NEARBY_SEARCH_URL, params=params).json()
+        # 只快取成功的查詢（包含查無結果）
+        if r.get("status") not in ("OK", "ZERO_RESULTS"):
+            return None
+        return r.get("results", [])
+    return geo_cache.get_or_fetch(place_key("google", lat, lng, radius, search_kw), fetch, PLACES_TTL) or []
+
+def search_keywords(selected_categories, keyword=""):
+    """要查詢的 (類別, 關鍵字, 實際送出的關鍵字)"""
+    searches = []
+    for cat in selected_categories:
+        for kw in CATEGORY_KEYWORDS[cat]:
+            searches.append((cat, kw, f"{kw} {keyword}" if keyword else kw))
+    if keyword and not selected_categories:
+        searches.append(("關鍵字", keyword, keyword))
+    return searches
+
+def compare_houses(points, api_key, selected_categories, keyword="", radius=500):
+    """
+    一次查詢多間房屋的周邊地點。
+    相近的房屋共用同一組查詢（見 plan_query_groups），所有 (位置, 關鍵字) 查詢同時送出，
+    最後依各房屋的座標計算距離並篩選 radius 內的地點。
+
+    共用查詢的範圍較大，但同樣只回傳 20 筆；回傳滿 20 筆時（地點密集，例如便利商店、餐廳），
+    該關鍵字改為各房屋分別查詢，避免同組房屋分到的地點比單獨查詢少而影響比較。
+    回傳 (每間房屋的地點資料表清單, 實際查詢數)。
+    """
+    searches = search_keywords(selected_categories, keyword)
+    groups = plan_query_groups(points, radius)
+
+    def run_all(queries):
+        # queries: {鍵: (lat, lng, 搜尋關鍵字, 半徑)}
+        with ThreadPoolExecutor(max_workers=MAX_QUERY_WORKERS) as executor:
+            futures = {key: executor.submit(nearby_search, lat, lng, api_key, search_kw, r)
+                       for key, (lat, lng, search_kw, r) in queries.items()}
+            return {key: future.result() for key, future in futures.items()}
+
+    shared = run_all({
+        (g, s): (group["lat"], group["lng"], search_kw, group["radius"])
+        for g, group in enumerate(groups) for s, (_, _, search_kw) in enumerate(searches)
+    })
+    fallback = run_all({
+        (i, s): (points[i][0], points[i][1], searches[s][2], radius)
+        for (g, s), results in shared.items()
+        if len(groups[g]["members"]) > 1 and len(results) >= NEARBY_SEARCH_PAGE_SIZE
+        for i in groups[g]["members"]
+    })
+
+    house_places = [None] * len(points)
+    for g, group in enumerate(groups):
+        for i in group["members"]:
+            batches = [(cat, kw, fallback.get((i, s), shared[(g, s)])) for s, (cat, kw, _) in enumerate(searches)]
+            house_places[i] = merge_places(batches, points[i][0], points[i][1], radius)
+    return house_places, len(shared) + len(fallback)
+
+def add_markers(m, places):
+    # 每個地點一個標記，顏色取第一個符合的類別
+    for p in places.itertuples():
+        color = CATEGORY_COLORS.get(p.categories[0], "#000000")
+        folium.Marker(
+            [p.lat, p.lng],
+            popup=f"{'/'.join(p.categories)}：{p.name}（{p.dist} 公尺）",
+            icon=folium.Icon(color="blue", icon="info-sign")
+        ).add_to(m)
+        folium.CircleMarker(
+            location=[p.lat, p.lng],
+            radius=6,
+            color=color,
+            fill=True,
+            fill_opacity=0.8
+        ).add_to(m)
+
+def format_info(label, address, places, categories):
+    lines = [f"{label}（{address}）："]
+    for k, v in category_counts(places, categories).items():
+        lines.append(f"- {k}: {v} 個")
+    lines.append(f"- 不重複地點合計: {len(places)} 個")
     return "\n".join(lines)
 
+def comparison_table(labels, addresses, house_places, categories):
+    """每間房屋一列：各類別地點數、不重複地點合計、各類別最近距離"""
+    rows = []
+    for label, address, places in zip(labels, addresses, house_places):
+        row = {"房屋": label, "地址": address}
+        row.update({f"{cat}（個）": n for cat, n in category_counts(places, categories).items()})
+        row["合計（個）"] = len(places)
+        for cat in categories:
+            dists = [p.dist for p in places.itertuples() if cat in p.categories]
+            row[f"最近{cat}（公尺）"] = min(dists) if dists else None
+        rows.append(row)
+    return pd.DataFrame(rows).set_index("房屋")
+
 # ===============================
 # Streamlit 介面
 # ===============================
@@ -117,11 +167,8 @@ gemini_key = st.text_input("🔑 輸入 Gemini API Key", type="password")
 if google_key and gemini_key:
     genai.configure(api_key=gemini_key)
 
-    col1, col2 = st.columns(2)
-    with col1:
-        addr_a = st.text_input("房屋 A 地址")
-    with col2:
-        addr_b = st.text_input("房屋 B 地址")
+    address_text = st.text_area(f"房屋地址（每行一間，2～{MAX_HOUSES} 間）")
+    addresses = [line.strip() for line in address_text.splitlines() if line.strip()]
 
     radius = st.slider("搜尋半徑 (公尺)", 100, 2000, 500, 50)
     keyword = st.text_input("關鍵字搜尋（可留空）")
@@ -140,46 +187,50 @@ if google_key and gemini_key:
                 selected_categories.append(cat)
 
     if st.button("比較房屋"):
-        if not addr_a or not addr_b:
-            st.warning("請輸入兩個地址")
+        if not 2 <= len(addresses) <= MAX_HOUSES:
+            st.warning(f"請輸入 2～{MAX_HOUSES} 個地址")
             st.stop()
         if not selected_categories and not keyword:
             st.warning("請至少選擇一個類別或輸入關鍵字")
             st.stop()
 
-        lat_a, lng_a = geocode_address(addr_a, google_key)
-        lat_b, lng_b = geocode_address(addr_b, google_key)
-        if not lat_a or not lat_b:
-            st.error("❌ 無法解析其中一個地址")
+        with ThreadPoolExecutor(max_workers=MAX_QUERY_WORKERS) as executor:
+            points = list(executor.map(lambda addr: geocode_address(addr, google_key), addresses))
+        failed = [addr for addr, (lat, _) in zip(addresses, points) if not lat]
+        if failed:
+            st.error(f"❌ 無法解析地址：{'、'.join(failed)}")
             st.stop()
 
-        info_a = query_by_keyword(lat_a, lng_a, google_key, selected_categories, keyword, radius)
-        info_b = query_by_keyword(lat_b, lng_b, google_key, selected_categories, keyword, radius)
-
-        text_a = format_info(addr_a, info_a)
-        text_b = format_info(addr_b, info_b)
-
-        # 房屋 A 地圖
-        st.subheader("📍 房屋 A 周邊地圖")
-        m_a = folium.Map(location=[lat_a, lng_a], zoom_start=15)
-        folium.Marker([lat_a, lng_a], popup=f"房屋 A：{addr_a}", icon=folium.Icon(color="red", icon="home")).add_to(m_a)
-        folium.Circle([lat_a, lng_a], radius=radius, color="red", fill=True, fill_opacity=0.1).add_to(m_a)
-        add_markers(m_a, info_a)
-        html(m_a._repr_html_(), height=400)
-
-        # 房屋 B 地圖
-        st.subheader("📍 房屋 B 周邊地圖")
-        m_b = folium.Map(location=[lat_b, lng_b], zoom_start=15)
-        folium.Marker([lat_b, lng_b], popup=f"房屋 B：{addr_b}", icon=folium.Icon(color="blue", icon="home")).add_to(m_b)
-        folium.Circle([lat_b, lng_b], radius=radius, color="blue", fill=True, fill_opacity=0.1).add_to(m_b)
-        add_markers(m_b, info_b)
-        html(m_b._repr_html_(), height=400)
+        labels = [f"房屋 {chr(ord('A') + i)}" for i in range(len(addresses))]
+        house_places, query_count = compare_houses(points, google_key, selected_categories, keyword, radius)
+        naive_count = len(addresses) * len(search_keywords(selected_categories, keyword))
+        st.caption(f"共送出 {query_count} 組周邊查詢（逐間查詢需要 {naive_count} 組）")
+
+        categories = selected_categories or ["關鍵字"]
+        texts = [format_info(label, addr, places, categories)
+                 for label, addr, places in zip(labels, addresses, house_places)]
+
+        # 比較表
+        st.subheader("📋 生活機能比較表")
+        st.dataframe(comparison_table(labels, addresses, house_places, categories))
+
+        # 所有房屋畫在同一張地圖，周邊地點只畫一次
+        st.subheader("📍 房屋周邊地圖")
+        m = folium.Map(location=[sum(p[0] for p in points) / len(points), sum(p[1] for p in points) / len(points)],
+                       zoom_start=14)
+        for i, (label, addr, (lat, lng)) in enumerate(zip(labels, addresses, points)):
+            color = HOUSE_COLORS[i % len(HOUSE_COLORS)]
+            folium.Marker([lat, lng], popup=f"{label}：{addr}", icon=folium.Icon(color=color, icon="home")).add_to(m)
+            folium.Circle([lat, lng], radius=radius, color=color, fill=True, fill_opacity=0.1).add_to(m)
+        add_markers(m, pd.concat(house_places).drop_duplicates(["place_id", "name", "lat", "lng"]))
+        m.fit_bounds([[p[0], p[1]] for p in points])
+        html(m._repr_html_(), height=500)
 
         # Gemini 分析
-        prompt = f"""你是一位房地產分析專家，請比較以下兩間房屋的生活機能，
-        並列出優缺點與結論：
-        {text_a}
-        {text_b}
+        houses_text = "\n".join(texts)
+        prompt = f"""你是一位房地產分析專家，請比較以下 {len(addresses)} 間房屋的生活機能，
+        並列出各自的優缺點、排名與結論：
+        {houses_text}
         """
         model = genai.GenerativeModel("gemini-2.0-flash")
         response = model.generate_content(prompt)
@@ -188,8 +239,10 @@ if google_key and gemini_key:
         st.write(response.text)
 
         st.sidebar.subheader("🏠 房屋資訊對照表")
-        st.sidebar.markdown(f"### 房屋 A\n{text_a}")
-        st.sidebar.markdown(f"### 房屋 B\n{text_b}")
+        for label, text in zip(labels, texts):
+            st.sidebar.markdown(f"### {label}\n{text}")
+        stats = geo_cache.stats()
+        st.sidebar.caption(f"查詢快取：命中 {stats['hits']} 次、未命中 {stats['misses']} 次（共 {stats['entries']} 筆）")
 
 else:
     st.info("請先輸入 Google Maps 與 Gemini API Key")
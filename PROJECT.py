@@ -1,5 +1,7 @@
 import streamlit as st
 import requests
+from modules import http_client
+from modules.geo_cache import get_geo_cache, geocode_key, place_key, GEOCODE_TTL, PLACES_TTL
 import folium
 import os
 from streamlit.components.v1 import html
@@ -50,6 +52,48 @@ PLACE_TAGS = {
     }
 }
 
+geo_cache = get_geo_cache()
+
+def geocode(address):
+    def fetch():
+        geo_url = "https://api.opencagedata.com/geocode/v1/json"
+        params = {
+            "q": address,
+            "key": API_KEY,
+            "language": "zh-TW",
+            "limit": 1
+        }
+        geo_res = http_client.get(geo_url, params=params, timeout=10).json()
+        if not geo_res["results"]:
+            return None
+        geometry = geo_res["results"][0]["geometry"]
+        return [geometry["lat"], geometry["lng"]]
+    return geo_cache.get_or_fetch(geocode_key("opencage", address), fetch, GEOCODE_TTL)
+
+def overpass_elements(tag, lat, lng, radius=400):
+    def fetch():
+        query = f"""
+        [out:json];
+        (
+          node{tag}(around:{radius},{lat},{lng});
+          way{tag}(around:{radius},{lat},{lng});
+          relation{tag}(around:{radius},{lat},{lng});
+        );
+        out center;
+        """
+        res = http_client.post(
+            "https://overpass-api.de/api/interpreter",
+            data=query.encode("utf-8"),
+            headers={"User-Agent": "StreamlitApp"},
+            timeout=20
+        )
+        data = res.json()
+        # 逾時等錯誤時 Overpass 會附上 remark，這種結果不快取
+        if "remark" in data:
+            return None
+        return data.get("elements", [])
+    return geo_cache.get_or_fetch(place_key("overpass", lat, lng, radius, tag), fetch, PLACES_TTL) or []
+
 st.title("🌍 地址周邊400公尺查詢 (OSM + OpenCage)")
 
 address = st.text_input("輸入地址")
@@ -64,19 +108,11 @@ else:
     selected_types = [main_category]
 
 if st.button("查詢"):
-    # 1️⃣ 轉換地址到經緯度 (OpenCage)
-    geo_url = "https://api.opencagedata.com/geocode/v1/json"
-    params = {
-        "q": address,
-        "key": API_KEY,
-        "language": "zh-TW",
-        "limit": 1
-    }
+    # 1️⃣ 轉換地址到經緯度 (OpenCage，有快取時不連線)
     try:
-        geo_res = requests.get(geo_url, params=params, timeout=10).json()
-        if geo_res["results"]:
-            lat = geo_res["results"][0]["geometry"]["lat"]
-            lng = geo_res["results"][0]["geometry"]["lng"]
+        location = geocode(address)
+        if location:
+            lat, lng = location
         else:
             st.error("無法解析該地址")
             st.stop()
@@ -93,28 +129,13 @@ if st.button("查詢"):
     targets = selected_types if isinstance(PLACE_TAGS[main_category], dict) else [main_category]
     for t in targets:
         tag = PLACE_TAGS[main_category][t] if isinstance(PLACE_TAGS[main_category], dict) else PLACE_TAGS[t]
-        query = f"""
-        [out:json];
-        (
-          node{tag}(around:400,{lat},{lng});
-          way{tag}(around:400,{lat},{lng});
-          relation{tag}(around:400,{lat},{lng});
-        );
-        out center;
-        """
         try:
-            res = requests.post(
-                "https://overpass-api.de/api/interpreter",
-                data=query.encode("utf-8"),
-                headers={"User-Agent": "StreamlitApp"},
-                timeout=20
-            )
-            data = res.json()
+            elements = overpass_elements(tag, lat, lng)
         except requests.exceptions.RequestException as e:
             st.warning(f"無法查詢 {t}: {e}")
             continue
 
-        for el in data.get("elements", []):
+        for el in elements:
             # 建築物 way/relation 會有 center
             if "lat" in el and "lon" in el:
                 lat_el, lon_el = el["lat"], el["lon"]
@@ -138,6 +159,8 @@ if st.button("查詢"):
             st.write(f"**{t}** - {name}")
     else:
         st.write("該範圍內無相關地點。")
+    stats = geo_cache.stats()
+    st.caption(f"查詢快取：命中 {stats['hits']} 次、未命中 {stats['misses']} 次（共 {stats['entries']} 筆）")
 
     map_html = m._repr_html_()
     html(map_html, height=500)
@@ -0,0 +1,188 @@
+import os
+import json
+import argparse
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+try:
+    from modules import http_client
+    from modules.geo_cache import normalize_address
+except ImportError:
+    # 直接執行 python modules/batch_geocode.py 時
+    import http_client
+    from geo_cache import normalize_address
+
+# 591 物件清單只有文字地址，批次轉成座標後寫到旁邊的 Parquet（每個物件一列：編號、地址、lat、lng、status）
+LISTINGS_PATH = "Taichung-city_buy_properties.csv"
+SIDECAR_PATH = "./data/Taichung-city_buy_properties.geo.parquet"
+
+GOOGLE_GEOCODE_URL = "https://maps.googleapis.com/maps/api/geocode/json"
+OPENCAGE_GEOCODE_URL = "https://api.opencagedata.com/geocode/v1/json"
+
+# status：ok 已定位、not_found 查無此地址、pending 查詢失敗（下次重跑會再查）
+STATUS_OK = "ok"
+STATUS_NOT_FOUND = "not_found"
+STATUS_PENDING = "pending"
+
+# 每完成多少個地址印一次進度
+PROGRESS_EVERY = 200
+
+def google_geocoder(api_key, url=GOOGLE_GEOCODE_URL):
+    """
+    建立 Google Geocoding 定位函式：地址 -> (lat, lng)，查無地址回傳 None。
+    其他錯誤（金鑰、配額、連線）會拋出例外，該地址不寫入進度檔，下次重跑再查。
+    """
+    def geocode(address):
+        params = {"address": address, "key": api_key, "language": "zh-TW"}
+        r = http_client.get(url, params=params, timeout=10).json()
+        status = r.get("status")
+        if status == "OK" and r["results"]:
+            loc = r["results"][0]["geometry"]["location"]
+            return loc["lat"], loc["lng"]
+        if status == "ZERO_RESULTS":
+            return None
+        raise RuntimeError(f"Geocoding 失敗：{status}")
+    return geocode
+
+def opencage_geocoder(api_key, url=OPENCAGE_GEOCODE_URL):
+    """建立 OpenCage 定位函式，回傳規則同 google_geocoder"""
+    def geocode(address):
+        params = {"q": address, "key": api_key, "language": "zh-TW", "limit": 1}
+        resp = http_client.get(url, params=params, timeout=10)
+        if resp.status_code != 200:
+            raise RuntimeError(f"OpenCage 失敗，狀態碼: {resp.status_code}")
+        results = resp.json().get("results", [])
+        if not results:
+            return None
+        geometry = results[0]["geometry"]
+        return geometry["lat"], geometry["lng"]
+    return geocode
+
+def checkpoint_path(sidecar_path):
+    return sidecar_path + ".checkpoint.jsonl"
+
+def load_known_locations(sidecar_path):
+    """
+    讀取已經查過的地址：先讀上一次的 Parquet，再讀中斷時留下的進度檔。
+    回傳 {正規化地址: (lat, lng) 或 None}，None 代表查無此地址。
+    """
+    known = {}
+    if os.path.exists(sidecar_path):
+        sidecar = pd.read_parquet(sidecar_path)
+        done = sidecar[sidecar["status"] != STATUS_PENDING].drop_duplicates("地址")
+        for row in done.itertuples(index=False):
+            known[normalize_address(row.地址)] = (row.lat, row.lng) if row.status == STATUS_OK else None
+
+    path = checkpoint_path(sidecar_path)
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # 中斷時最後一行可能沒寫完
+                    continue
+                location = record["location"]
+                known[record["address"]] = tuple(location) if location else None
+    return known
+
+def geocode_listings(geocoder, listings_path=LISTINGS_PATH, sidecar_path=SIDECAR_PATH, workers=8):
+    """
+    批次定位物件清單並寫入座標 Parquet，回傳統計資料。
+
+    - 地址先正規化再去重，同一路段的物件只查一次
+    - 已在上次結果或進度檔中的地址不再查詢，重跑時只會查新物件的地址
+    - 以最多 workers 個執行緒同時查詢，每查完一個地址就追加到進度檔，中斷後可從進度檔接續
+    """
+    listings = pd.read_csv(listings_path, usecols=["編號", "地址"], dtype=str, encoding="utf-8-sig")
+    listings = listings.dropna(subset=["地址"]).drop_duplicates(["編號", "地址"]).reset_index(drop=True)
+    normalized = listings["地址"].map(normalize_address)
+
+    known = load_known_locations(sidecar_path)
+    unique_addresses = normalized.drop_duplicates()
+    # 正規化地址 -> 第一個出現的原始地址（實際送出查詢的字串）
+    pending = {norm: listings["地址"].iat[i] for i, norm in unique_addresses.items() if norm not in known}
+    reused = len(unique_addresses) - len(pending)
+    print(f"📍 {len(listings)} 筆物件、{len(unique_addresses)} 個不同地址，"
+          f"沿用 {reused} 個、需要查詢 {len(pending)} 個")
+
+    failed = 0
+    if pending:
+        os.makedirs(os.path.dirname(sidecar_path) or ".", exist_ok=True)
+        with open(checkpoint_path(sidecar_path), "a", encoding="utf-8") as checkpoint, \
+                ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(geocoder, address): norm for norm, address in pending.items()}
+            for done, future in enumerate(as_completed(futures), 1):
+                norm = futures[future]
+                try:
+                    location = future.result()
+                except Exception as e:
+                    failed += 1
+                    print(f"⚠️ 定位失敗 {pending[norm]}：{e}")
+                else:
+                    known[norm] = tuple(location) if location else None
+                    record = {"address": norm, "location": list(location) if location else None}
+                    checkpoint.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    checkpoint.flush()
+                if done % PROGRESS_EVERY == 0:
+                    print(f"進度 {done}/{len(pending)}")
+
+    lats, lngs, status = [], [], []
+    for norm in normalized:
+        if norm not in known:
+            location, state = None, STATUS_PENDING
+        elif known[norm] is None:
+            location, state = None, STATUS_NOT_FOUND
+        else:
+            location, state = known[norm], STATUS_OK
+        lats.append(location[0] if location else np.nan)
+        lngs.append(location[1] if location else np.nan)
+        status.append(state)
+    sidecar = pd.DataFrame({
+        "編號": listings["編號"],
+        "地址": listings["地址"],
+        "lat": np.array(lats, dtype="float64"),
+        "lng": np.array(lngs, dtype="float64"),
+        "status": pd.Categorical(status, categories=[STATUS_OK, STATUS_NOT_FOUND, STATUS_PENDING]),
+    })
+
+    tmp_path = sidecar_path + ".tmp"
+    sidecar.to_parquet(tmp_path, index=False, compression="zstd")
+    os.replace(tmp_path, sidecar_path)
+    # 結果都已寫入 Parquet，進度檔不再需要
+    if os.path.exists(checkpoint_path(sidecar_path)):
+        os.remove(checkpoint_path(sidecar_path))
+
+    summary = {
+        "listings": len(listings),
+        "unique_addresses": len(unique_addresses),
+        "reused": reused,
+        "geocoded": len(pending) - failed,
+        "failed": failed,
+        "located_listings": status.count(STATUS_OK),
+    }
+    print(f"✅ 已寫入 {sidecar_path}：{summary}")
+    return summary
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="批次將物件地址轉成座標")
+    parser.add_argument("--listings", default=LISTINGS_PATH, help="物件清單 CSV")
+    parser.add_argument("--output", default=SIDECAR_PATH, help="座標 Parquet 路徑")
+    parser.add_argument("--geocoder", choices=["google", "opencage"], default="google")
+    parser.add_argument("--url", help="Geocoding API 網址（例如 modules/fake_geocoder.py 的本機替身）")
+    parser.add_argument("--workers", type=int, default=8, help="同時查詢的數量")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.geocoder == "google":
+        api_key = os.environ.get("GOOGLE_MAPS_API_KEY")
+        factory = google_geocoder
+    else:
+        api_key = os.environ.get("OPENCAGE_API_KEY")
+        factory = opencage_geocoder
+    if not api_key and not args.url:
+        raise SystemExit("❌ 找不到 API Key，請設定 GOOGLE_MAPS_API_KEY 或 OPENCAGE_API_KEY")
+    geocoder = factory(api_key, url=args.url) if args.url else factory(api_key)
+    geocode_listings(geocoder, args.listings, args.output, workers=args.workers)
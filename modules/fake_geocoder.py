@@ -0,0 +1,90 @@
+import json
+import time
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+# 本機的 Google Geocoding API 替身，用來測試批次定位而不消耗配額：
+# - 座標由地址雜湊決定（落在台中市範圍內），同一地址每次都相同
+# - 地址含「查無」時回傳 ZERO_RESULTS，含「逾時」時回傳 503
+# 用法：
+#   server = FakeGeocoder(); url = server.start()
+#   geocode_listings(..., geocoder=google_geocoder("test", url=url))
+
+TAICHUNG_BOUNDS = (24.0, 24.35, 120.5, 121.0)  # (南, 北, 西, 東)
+
+def fake_location(address):
+    digest = hashlib.md5(address.encode("utf-8")).digest()
+    south, north, west, east = TAICHUNG_BOUNDS
+    lat = south + (north - south) * int.from_bytes(digest[:4], "big") / 2 ** 32
+    lng = west + (east - west) * int.from_bytes(digest[4:8], "big") / 2 ** 32
+    return round(lat, 7), round(lng, 7)
+
+class FakeGeocoder:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.requests = []  # 收到的地址，用來檢查呼叫次數
+        self.lock = threading.Lock()
+        self._server = None
+
+    def handle(self, address):
+        """回傳 (狀態碼, JSON)"""
+        with self.lock:
+            self.requests.append(address)
+        if self.delay:
+            time.sleep(self.delay)
+        if "逾時" in address:
+            return 503, {"status": "UNKNOWN_ERROR", "results": []}
+        if not address or "查無" in address:
+            return 200, {"status": "ZERO_RESULTS", "results": []}
+        lat, lng = fake_location(address)
+        return 200, {"status": "OK", "results": [
+            {"formatted_address": address, "geometry": {"location": {"lat": lat, "lng": lng}}}
+        ]}
+
+    def start(self, host="127.0.0.1", port=0):
+        """在背景執行緒啟動伺服器，回傳 Geocoding API 網址"""
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                address = parse_qs(parts.query).get("address", [""])[0]
+                status, payload = fake.handle(address)
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                try:
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    # 用戶端已中斷（例如批次定位被強制結束）
+                    pass
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return f"http://{host}:{self._server.server_address[1]}/maps/api/geocode/json"
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本機 Google Geocoding API 替身")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--delay", type=float, default=0.0, help="每個請求的延遲秒數")
+    args = parser.parse_args()
+    server = FakeGeocoder(delay=args.delay)
+    print(f"Geocoding URL: {server.start(port=args.port)}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,216 @@
+import re
+import json
+import base64
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, unquote
+
+# 本機的 GitHub API 替身，只實作發佈統計檔會用到的端點（資料都放在記憶體）：
+# - contents API：GET / PUT /repos/{owner}/{repo}/contents/{path}
+# - Git Data API：blobs、trees、commits、refs
+# 用法：
+#   server = FakeGitHub(); api_url = server.start()
+#   github_publish_files(..., api_url=api_url)
+#   server.files("main")  # 分支上的檔案 {路徑: bytes}
+# 也可以直接執行 python -m modules.fake_github --port 8765，
+# 再以環境變數 GITHUB_API_URL=http://127.0.0.1:8765 指向它。
+
+def git_blob_sha(content):
+    """與 git 相同的 blob 雜湊：sha1(b"blob <長度>\\0" + 內容)"""
+    return hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+
+def _object_sha(kind, payload):
+    return hashlib.sha1(kind.encode() + json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+class FakeGitHub:
+    def __init__(self, branch="main"):
+        self.blobs = {}
+        self.trees = {}
+        self.commits = {}
+        self.refs = {}
+        self.requests = []  # (方法, 路徑)，用來檢查呼叫次數
+        self.lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+        empty_tree = self._put_tree({})
+        self.refs[branch] = self._put_commit(empty_tree, [], "initial commit")
+
+    def _put_tree(self, entries):
+        sha = _object_sha("tree", entries)
+        self.trees[sha] = dict(entries)
+        return sha
+
+    def _put_commit(self, tree_sha, parents, message):
+        payload = {"tree": tree_sha, "parents": list(parents), "message": message, "n": len(self.commits)}
+        sha = _object_sha("commit", payload)
+        self.commits[sha] = payload
+        return sha
+
+    def files(self, branch="main"):
+        """分支目前的檔案內容 {路徑: bytes}"""
+        with self.lock:
+            tree = self.trees[self.commits[self.refs[branch]]["tree"]]
+            return {path: self.blobs[sha] for path, sha in tree.items()}
+
+    def commit_count(self, branch="main"):
+        """分支上的 commit 數（含初始 commit）"""
+        with self.lock:
+            count, sha = 0, self.refs[branch]
+            while sha:
+                count += 1
+                parents = self.commits[sha]["parents"]
+                sha = parents[0] if parents else None
+            return count
+
+    def advance(self, branch, path, content, message="外部推送"):
+        """模擬其他人同時推進分支"""
+        with self.lock:
+            head = self.refs[branch]
+            tree = dict(self.trees[self.commits[head]["tree"]])
+            sha = git_blob_sha(content)
+            self.blobs[sha] = content
+            tree[path] = sha
+            self.refs[branch] = self._put_commit(self._put_tree(tree), [head], message)
+
+    def handle(self, method, path, query, body):
+        """回傳 (狀態碼, JSON)"""
+        with self.lock:
+            self.requests.append((method, path))
+            match = re.fullmatch(r"/repos/[^/]+/[^/]+/(.+)", path)
+            if not match:
+                return 404, {"message": "Not Found"}
+            route = match.group(1)
+
+            if route.startswith("contents/"):
+                return self._contents(method, unquote(route[len("contents/"):]), query, body)
+
+            if method == "POST" and route == "git/blobs":
+                content = base64.b64decode(body["content"]) if body.get("encoding") == "base64" \
+                    else body["content"].encode("utf-8")
+                sha = git_blob_sha(content)
+                self.blobs[sha] = content
+                return 201, {"sha": sha}
+
+            if method == "POST" and route == "git/trees":
+                entries = dict(self.trees.get(body.get("base_tree"), {}))
+                for entry in body["tree"]:
+                    if entry.get("sha") is None:
+                        entries.pop(entry["path"], None)
+                    elif entry["sha"] not in self.blobs:
+                        return 422, {"message": f"blob {entry['sha']} 不存在"}
+                    else:
+                        entries[entry["path"]] = entry["sha"]
+                return 201, {"sha": self._put_tree(entries)}
+
+            match = re.fullmatch(r"git/trees/([0-9a-f]+)", route)
+            if method == "GET" and match:
+                tree = self.trees.get(match.group(1))
+                if tree is None:
+                    return 404, {"message": "Not Found"}
+                return 200, {"sha": match.group(1), "truncated": False, "tree": [
+                    {"path": p, "mode": "100644", "type": "blob", "sha": s, "size": len(self.blobs[s])}
+                    for p, s in sorted(tree.items())
+                ]}
+
+            if method == "POST" and route == "git/commits":
+                if body["tree"] not in self.trees:
+                    return 422, {"message": "tree 不存在"}
+                sha = self._put_commit(body["tree"], body.get("parents", []), body["message"])
+                return 201, {"sha": sha, "tree": {"sha": body["tree"]}}
+
+            match = re.fullmatch(r"git/commits/([0-9a-f]+)", route)
+            if method == "GET" and match:
+                commit = self.commits.get(match.group(1))
+                if commit is None:
+                    return 404, {"message": "Not Found"}
+                return 200, {"sha": match.group(1), "tree": {"sha": commit["tree"]},
+                             "parents": [{"sha": p} for p in commit["parents"]], "message": commit["message"]}
+
+            match = re.fullmatch(r"git/refs?/heads/(.+)", route)
+            if match:
+                branch = match.group(1)
+                if method == "GET":
+                    if branch not in self.refs:
+                        return 404, {"message": "Not Found"}
+                    return 200, {"ref": f"refs/heads/{branch}", "object": {"type": "commit", "sha": self.refs[branch]}}
+                if method == "PATCH":
+                    new_sha = body["sha"]
+                    if new_sha not in self.commits:
+                        return 422, {"message": "commit 不存在"}
+                    # 非 force 更新必須是 fast-forward：新 commit 的父節點要是目前的分支頭
+                    if not body.get("force") and self.refs.get(branch) not in self.commits[new_sha]["parents"]:
+                        return 422, {"message": "Update is not a fast forward"}
+                    self.refs[branch] = new_sha
+                    return 200, {"ref": f"refs/heads/{branch}", "object": {"type": "commit", "sha": new_sha}}
+
+            return 404, {"message": "Not Found"}
+
+    def _contents(self, method, file_path, query, body):
+        branch = (body or {}).get("branch") or query.get("ref") or "main"
+        head = self.refs[branch]
+        tree = self.trees[self.commits[head]["tree"]]
+        if method == "GET":
+            if file_path not in tree:
+                return 404, {"message": "Not Found"}
+            sha = tree[file_path]
+            return 200, {"path": file_path, "sha": sha, "content": base64.b64encode(self.blobs[sha]).decode()}
+        if method == "PUT":
+            # 與 GitHub 相同：更新既有檔案時必須帶上目前的 sha
+            if file_path in tree and body.get("sha") != tree[file_path]:
+                return 409, {"message": f"{file_path} does not match {body.get('sha')}"}
+            content = base64.b64decode(body["content"])
+            sha = git_blob_sha(content)
+            self.blobs[sha] = content
+            entries = dict(tree)
+            entries[file_path] = sha
+            self.refs[branch] = self._put_commit(self._put_tree(entries), [head], body["message"])
+            return (200 if file_path in tree else 201), {"content": {"path": file_path, "sha": sha}}
+        return 405, {"message": "Method Not Allowed"}
+
+    def start(self, host="127.0.0.1", port=0):
+        """在背景執行緒啟動伺服器，回傳 API 網址"""
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _dispatch(self):
+                parts = urlsplit(self.path)
+                query = dict(q.split("=", 1) for q in parts.query.split("&") if "=" in q)
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length)) if length else None
+                status, payload = fake.handle(self.command, parts.path, query, body)
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = do_PUT = do_PATCH = _dispatch
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return f"http://{host}:{self._server.server_address[1]}"
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本機 GitHub API 替身")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    server = FakeGitHub()
+    print(f"GITHUB_API_URL={server.start(port=args.port)}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,110 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import unicodedata
+
+# MAPP.py、NNNNN.py、PROJECT.py 共用的地理查詢快取（SQLite 檔，存在磁碟上）：
+# - 地址轉座標以正規化後的地址為鍵
+# - 周邊查詢以 (四捨五入後的座標格, 半徑, 關鍵字) 為鍵，移動不到一格的查詢可以共用結果
+# - 每筆資料有到期時間，總筆數超過上限時淘汰最久沒用到的資料（LRU）
+GEO_CACHE_PATH = "./data/geo_cache.sqlite"
+GEO_CACHE_MAX_ENTRIES = 50000
+GEOCODE_TTL = 30 * 24 * 3600  # 地址座標很少變動
+PLACES_TTL = 7 * 24 * 3600    # 店家開關較頻繁
+
+# 座標取到小數第 4 位（約 11 公尺一格）
+CELL_DECIMALS = 4
+
+def normalize_address(address):
+    """全形轉半形、去除空白、臺→台，讓同一個地址的不同寫法對到同一個鍵"""
+    text = unicodedata.normalize("NFKC", str(address))
+    return "".join(text.split()).replace("臺", "台").lower()
+
+def geocode_key(provider, address):
+    return f"geocode|{provider}|{normalize_address(address)}"
+
+def place_key(provider, lat, lng, radius, keyword):
+    return f"place|{provider}|{lat:.{CELL_DECIMALS}f},{lng:.{CELL_DECIMALS}f}|{int(radius)}|{keyword}"
+
+class GeoCache:
+    def __init__(self, path=GEO_CACHE_PATH, max_entries=GEO_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS cache_last_used ON cache (last_used)")
+        self.conn.commit()
+
+    def get(self, key):
+        """取得未過期的資料並更新使用時間；沒有資料時回傳 None"""
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None or row[1] < now:
+                if row is not None:
+                    self.conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                    self.conn.commit()
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE cache SET last_used = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            self.hits += 1
+            return json.loads(row[0])
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now + ttl, now),
+            )
+            excess = self.conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0] - self.max_entries
+            if excess > 0:
+                self.conn.execute(
+                    "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY last_used LIMIT ?)", (excess,)
+                )
+            self.conn.commit()
+
+    def get_or_fetch(self, key, fetch, ttl):
+        """
+        有快取時直接回傳，否則呼叫 fetch() 取得並存入快取。
+        fetch() 回傳 None 代表查詢失敗，不會寫入快取，下次會重新查詢。
+        """
+        value = self.get(key)
+        if value is None:
+            value = fetch()
+            if value is not None:
+                self.set(key, value, ttl)
+        return value
+
+    def stats(self):
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM cache")
+            self.conn.commit()
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_geo_cache():
+    """取得整個行程共用的快取"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = GeoCache()
+    return _cache
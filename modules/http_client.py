@@ -0,0 +1,57 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# 所有對外連線共用的 HTTP 用戶端：
+# - 同一個 Session，每個主機各有連線池，TLS 連線可重複使用（keep-alive）
+# - 未指定 timeout 的請求一律套用預設值
+# - 連線錯誤與 429 / 5xx 以指數退避重試，並遵守 Retry-After
+
+DEFAULT_TIMEOUT = (5, 30)  # (連線, 讀取) 秒
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+class _TimeoutSession(requests.Session):
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+        return super().request(method, url, **kwargs)
+
+def create_session(retries=3, backoff_factor=0.5, pool_connections=20, pool_maxsize=16):
+    """建立帶有連線池與重試設定的 Session"""
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({"GET", "HEAD", "OPTIONS", "PUT", "POST"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,  # 重試用完時回傳最後的回應，由呼叫端判斷狀態碼
+    )
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+    session = _TimeoutSession()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """取得整個行程共用的 Session"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = create_session()
+    return _session
+
+def get(url, **kwargs):
+    return get_session().get(url, **kwargs)
+
+def post(url, **kwargs):
+    return get_session().post(url, **kwargs)
+
+def put(url, **kwargs):
+    return get_session().put(url, **kwargs)
+
+def patch(url, **kwargs):
+    return get_session().patch(url, **kwargs)
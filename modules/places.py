@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+
+# 周邊查詢結果的合併：多個關鍵字（例如 學校 / 小學 / 中學）常回傳同一個地點，
+# 以 place_id 合併成一筆，並保留它符合的所有類別與關鍵字。
+PLACE_COLUMNS = ["place_id", "name", "lat", "lng", "dist", "categories", "keywords"]
+
+EARTH_RADIUS = 6371000
+
+# 多間房屋比較時，與同組第一間房屋相距不超過此距離（公尺）的房屋共用同一次查詢
+SHARED_QUERY_OFFSET = 150
+
+def haversine(lat1, lon1, lat2, lon2):
+    """球面距離（公尺），lat2 / lon2 可以是陣列，一次算完所有地點"""
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = np.radians(np.asarray(lon2, dtype=float) - lon1)
+    a = np.sin(d_phi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(d_lambda / 2) ** 2
+    return EARTH_RADIUS * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+def merge_places(batches, lat, lng, radius=None):
+    """
+    合併多個查詢的結果。
+
+    - batches: [(類別, 關鍵字, Places API 的 results), ...]，依查詢順序排列
+    - radius: 有指定時只保留距離中心 radius 公尺內的地點
+
+    回傳每個地點一列的資料表（依距離排序），categories / keywords 為該地點符合的類別與關鍵字清單。
+    """
+    rows = [(cat, kw, p) for cat, kw, results in batches for p in results]
+    if not rows:
+        return pd.DataFrame(columns=PLACE_COLUMNS)
+
+    lats = np.array([p["geometry"]["location"]["lat"] for _, _, p in rows], dtype=float)
+    lngs = np.array([p["geometry"]["location"]["lng"] for _, _, p in rows], dtype=float)
+    dists = haversine(lat, lng, lats, lngs).astype(int)
+    keep = np.flatnonzero(dists <= radius) if radius is not None else np.arange(len(rows))
+
+    merged = {}
+    for i in keep:
+        cat, kw, p = rows[i]
+        place_id = p.get("place_id", "")
+        name = p.get("name", "未命名")
+        # 沒有 place_id 的地點以名稱 + 座標辨識
+        key = place_id or (name, lats[i], lngs[i])
+        place = merged.get(key)
+        if place is None:
+            merged[key] = {"place_id": place_id, "name": name, "lat": lats[i], "lng": lngs[i],
+                           "dist": int(dists[i]), "categories": [cat], "keywords": [kw]}
+            continue
+        if cat not in place["categories"]:
+            place["categories"].append(cat)
+        if kw not in place["keywords"]:
+            place["keywords"].append(kw)
+
+    places = pd.DataFrame(list(merged.values()), columns=PLACE_COLUMNS)
+    return places.sort_values("dist", kind="stable").reset_index(drop=True)
+
+def category_counts(places, categories):
+    """各類別的地點數（一個地點符合多個類別時各算一次）"""
+    counts = {cat: 0 for cat in categories}
+    for cats in places["categories"]:
+        for cat in cats:
+            counts[cat] = counts.get(cat, 0) + 1
+    return counts
+
+def plan_query_groups(points, radius, max_offset=SHARED_QUERY_OFFSET):
+    """
+    規劃多間房屋的周邊查詢：彼此相近的房屋合併成一組，只查詢一次。
+    每組以成員座標的中心查詢，半徑加大到涵蓋每個成員的 radius 範圍，
+    之後再依各房屋的座標與 radius 篩選結果。
+
+    - points: [(lat, lng), ...]
+    回傳 [{"lat", "lng", "radius", "members": [房屋索引, ...]}, ...]
+    """
+    lats = np.array([p[0] for p in points], dtype=float)
+    lngs = np.array([p[1] for p in points], dtype=float)
+    unassigned = list(range(len(points)))
+    groups = []
+    while unassigned:
+        seed = unassigned[0]
+        offsets = haversine(lats[seed], lngs[seed], lats[unassigned], lngs[unassigned])
+        members = [unassigned[i] for i in np.flatnonzero(offsets <= max_offset)]
+        center_lat, center_lng = lats[members].mean(), lngs[members].mean()
+        extra = haversine(center_lat, center_lng, lats[members], lngs[members]).max()
+        groups.append({
+            "lat": float(center_lat),
+            "lng": float(center_lng),
+            "radius": int(np.ceil(radius + extra)),
+            "members": members,
+        })
+        unassigned = [i for i in unassigned if i not in members]
+    return groups
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+
+# 圖表上固定的屋齡類別順序
+BUILD_TYPES = ["預售屋", "新成屋", "中古屋"]
+
+class PriceCube:
+    """
+    預先彙總的價格立方體：(全台 / 縣市 / 行政區) × BUILD × 年 × 季。
+    每格存 單價×筆數 的總和 (price_sum) 與總筆數 (count)，
+    加權平均 = price_sum / count，可在任何層級精確算出。
+    每個資料版本只需建立一次，之後依選擇查表即可。
+    """
+
+    def __init__(self, df):
+        cells = df[["縣市", "行政區", "BUILD", "year", "quarter"]].copy()
+        cells["price_sum"] = df["平均單價元平方公尺"] * df["交易筆數"]
+        cells["count"] = df["交易筆數"]
+
+        keys = ["BUILD", "year", "quarter"]
+        district = cells.groupby(["縣市", "行政區"] + keys, observed=True)[["price_sum", "count"]].sum()
+        city = cells.groupby(["縣市"] + keys, observed=True)[["price_sum", "count"]].sum()
+        nation = cells.groupby(keys, observed=True)[["price_sum", "count"]].sum()
+
+        # (縣市, 行政區) -> 以 (BUILD, year, quarter) 為索引的彙總表，None 代表該層級全部
+        self.slices = {(None, None): nation}
+        for city_name, group in city.groupby(level=0, observed=True):
+            self.slices[(city_name, None)] = group.droplevel(0)
+        for (city_name, district_name), group in district.groupby(level=[0, 1], observed=True):
+            self.slices[(city_name, district_name)] = group.droplevel([0, 1])
+
+        # 交易筆數分布用：下一層級各自的總筆數
+        self.children = {None: city["count"].groupby(level=0, observed=True).sum()}
+        for city_name, group in district["count"].groupby(level=0, observed=True):
+            self.children[city_name] = group.groupby(level=1, observed=True).sum()
+
+        self.years = sorted(nation.index.get_level_values("year").unique())
+        self._yearly = {}
+
+    def slice(self, city=None, district=None):
+        """取得某個選擇的 (BUILD, year, quarter) 彙總表，沒有資料時為空表"""
+        empty = pd.DataFrame(columns=["price_sum", "count"])
+        return self.slices.get((city, district), empty)
+
+    def yearly_mean(self, city=None, district=None):
+        """各年（民國）× BUILD 的加權平均單價，index 為年份、欄位為 BUILD"""
+        key = (city, district)
+        if key not in self._yearly:
+            cube = self.slice(city, district)
+            if cube.empty:
+                self._yearly[key] = pd.DataFrame()
+            else:
+                yearly = cube.groupby(level=["year", "BUILD"]).sum()
+                means = (yearly["price_sum"] / yearly["count"]).unstack("BUILD")
+                self._yearly[key] = means.sort_index()
+        return self._yearly[key]
+
+    def counts_by_child(self, city=None, district=None):
+        """全台時回傳各縣市總筆數，選了縣市時回傳各行政區總筆數"""
+        counts = self.children.get(city, pd.Series(dtype="int64"))
+        if district is not None:
+            counts = counts[counts.index == district]
+        return counts
+
+    def trend_series(self, city=None, district=None, builds=BUILD_TYPES, fill_value=0):
+        """
+        趨勢圖用的對齊序列：回傳 (西元年標籤, {BUILD: 各年加權平均單價})。
+        年份涵蓋整個資料集，某年或某類別沒有資料時填入 fill_value。
+        """
+        yearly = self.yearly_mean(city, district).reindex(index=self.years, columns=list(builds))
+        values = np.rint(yearly.to_numpy(dtype=float))
+        series = {
+            build: [int(v) if not np.isnan(v) else fill_value for v in values[:, i]]
+            for i, build in enumerate(builds)
+        }
+        year_labels = [str(year + 1911) for year in self.years]
+        return year_labels, series
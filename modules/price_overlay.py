@@ -0,0 +1,85 @@
+import os
+import json
+import numpy as np
+
+# 每期一個 GeoJSON，例如 ./output/geojson/行政區價格_11402.geojson
+GEOJSON_DIR = "./output/geojson"
+COORDS_PATH = "district_coords.json"
+
+# 價格級距數（依該期各行政區平均單價的分位數切分）
+PRICE_CLASSES = 5
+
+def season_geojson_path(season_code, out_dir=GEOJSON_DIR):
+    return os.path.join(out_dir, f"行政區價格_{season_code}.geojson")
+
+def load_district_coords(coords_path=COORDS_PATH):
+    with open(coords_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def district_feature_collection(result_df, district_coords):
+    """
+    將單一期數的統計結果轉成 GeoJSON FeatureCollection。
+    每個行政區一個點（行政區中心座標），屬性包含加權平均單價、交易筆數、
+    各 BUILD 類別的明細，以及該期的價格級距（0 最便宜）。
+    """
+    df = result_df[["縣市", "行政區", "BUILD", "平均單價元平方公尺", "交易筆數"]].copy()
+    df["price_sum"] = df["平均單價元平方公尺"] * df["交易筆數"]
+    totals = df.groupby(["縣市", "行政區"], observed=True)[["price_sum", "交易筆數"]].sum()
+    totals = totals[totals["交易筆數"] > 0]
+    totals["平均單價元平方公尺"] = (totals["price_sum"] / totals["交易筆數"]).round(2)
+
+    if len(totals) > 0:
+        ranks = totals["平均單價元平方公尺"].rank(method="first", pct=True).to_numpy()
+        totals["價格級距"] = np.minimum((ranks * PRICE_CLASSES).astype(int), PRICE_CLASSES - 1)
+
+    breakdown = {}
+    for row in df.itertuples(index=False):
+        breakdown.setdefault((row.縣市, row.行政區), {})[row.BUILD] = {
+            "平均單價元平方公尺": round(float(row.平均單價元平方公尺), 2),
+            "交易筆數": int(row.交易筆數),
+        }
+
+    features = []
+    missing = 0
+    for (city, district), row in totals.iterrows():
+        coord = district_coords.get(city, {}).get(district)
+        if coord is None:
+            missing += 1
+            continue
+        features.append({
+            "type": "Feature",
+            # GeoJSON 座標順序為 [經度, 緯度]
+            "geometry": {"type": "Point", "coordinates": [coord[1], coord[0]]},
+            "properties": {
+                "縣市": city,
+                "行政區": district,
+                "平均單價元平方公尺": float(row["平均單價元平方公尺"]),
+                "交易筆數": int(row["交易筆數"]),
+                "價格級距": int(row["價格級距"]),
+                "BUILD": breakdown.get((city, district), {}),
+            },
+        })
+    if missing:
+        print(f"警告: {missing} 個行政區沒有座標，未放入 GeoJSON")
+    return {"type": "FeatureCollection", "features": features}
+
+def write_season_geojson(result_df, season_code, coords_path=COORDS_PATH, out_dir=GEOJSON_DIR):
+    """產生並寫入單一期數的行政區價格 GeoJSON，回傳檔案路徑"""
+    collection = district_feature_collection(result_df, load_district_coords(coords_path))
+    os.makedirs(out_dir, exist_ok=True)
+    path = season_geojson_path(season_code, out_dir)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(collection, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return path
+
+def ensure_season_geojson(season_code, season_df, source_mtime=None, coords_path=COORDS_PATH, out_dir=GEOJSON_DIR):
+    """
+    GeoJSON 不存在（例如只從 CSV 匯入的舊期數），或比來源資料舊時才重新產生。
+    source_mtime 為該期來源資料的修改時間。
+    """
+    path = season_geojson_path(season_code, out_dir)
+    if not os.path.exists(path) or (source_mtime is not None and os.path.getmtime(path) < source_mtime):
+        write_season_geojson(season_df, season_code, coords_path, out_dir)
+    return path
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+
+# 對數分桶的分位數草圖（與 DDSketch 相同的做法）：
+# 每個單價落在 gamma 次方的區間，只記錄 (桶號, 筆數)。
+# 合併草圖只需把同桶的筆數相加，估出的分位數相對誤差不超過 RELATIVE_ACCURACY。
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_LOG_GAMMA = np.log(GAMMA)
+
+SKETCH_KEYS = ["縣市", "行政區", "BUILD"]
+
+def price_buckets(values):
+    """單價 -> 桶號（只接受正數）"""
+    return np.ceil(np.log(np.asarray(values, dtype=float)) / _LOG_GAMMA).astype("int32")
+
+def bucket_values(buckets):
+    """桶號 -> 代表值（該桶上下界的中點，確保相對誤差）"""
+    return 2 * GAMMA ** np.asarray(buckets, dtype=float) / (GAMMA + 1)
+
+def build_sketches(transactions, price_col="單價元平方公尺"):
+    """
+    由逐筆交易建立每個 (縣市, 行政區, BUILD) 的草圖，
+    回傳長格式資料表：縣市、行政區、BUILD、bucket、count。
+    """
+    df = transactions.loc[transactions[price_col] > 0, SKETCH_KEYS + [price_col]].copy()
+    df["bucket"] = price_buckets(df[price_col])
+    sketches = df.groupby(SKETCH_KEYS + ["bucket"], observed=True).size().reset_index(name="count")
+    sketches["count"] = sketches["count"].astype("int32")
+    return sketches
+
+def quantile_rollup(sketches, by, quantiles=(0.25, 0.5, 0.75)):
+    """
+    依 by 指定的層級合併草圖並估計分位數。
+    例如 by=["縣市"] 會把同縣市所有行政區、所有期數的草圖合併；by=[] 為全台。
+    回傳每個群組的 筆數 與 p25 / p50 / p75 等欄位。
+    """
+    group_cols = list(by)
+    merged = sketches.groupby(group_cols + ["bucket"], observed=True)["count"].sum().reset_index()
+    merged = merged.sort_values(group_cols + ["bucket"], kind="stable")
+
+    if group_cols:
+        grouped = merged.groupby(group_cols, observed=True, sort=False)["count"]
+        merged["cum"] = grouped.cumsum()
+        merged["total"] = grouped.transform("sum")
+    else:
+        merged["cum"] = merged["count"].cumsum()
+        merged["total"] = merged["count"].sum()
+
+    result = None
+    for q in quantiles:
+        # 第一個累計筆數超過 q×(n-1) 的桶即為該分位數所在的桶
+        hit = merged[merged["cum"] > q * (merged["total"] - 1)]
+        if group_cols:
+            first = hit.groupby(group_cols, observed=True, sort=True).first()
+        else:
+            first = hit.head(1).set_index(pd.Index(["全台"], name="範圍"))
+        column = f"p{int(round(q * 100))}"
+        values = pd.DataFrame({column: bucket_values(first["bucket"]).round(0)}, index=first.index)
+        if result is None:
+            result = first[["total"]].rename(columns={"total": "筆數"}).join(values)
+        else:
+            result = result.join(values)
+    return result.reset_index()
@@ -1,11 +1,32 @@
 import os
 import requests
 import zipfile
+import numpy as np
 import pandas as pd
 import glob
+import fnmatch
 
 import base64
+import hashlib
 import json
+import argparse
+import contextlib
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+try:
+    from modules.season_store import write_season, write_transactions, load_season, stored_seasons, TRANSACTION_ROOT, SKETCH_ROOT
+    from modules.price_overlay import write_season_geojson
+    from modules.quantile_sketch import build_sketches
+    from modules import http_client
+except ImportError:
+    # 直接執行 python modules/real_estate_merger_pro.py 時
+    from season_store import write_season, write_transactions, load_season, stored_seasons, TRANSACTION_ROOT, SKETCH_ROOT
+    from price_overlay import write_season_geojson
+    from quantile_sketch import build_sketches
+    import http_client
 
 # 你的城市對照表和 classify_building_age 函式保持不變
 city_code_map = {
@@ -27,6 +48,44 @@ def classify_building_age(age):
     else:
         return "中古屋"
 
+def classify_building_ages(ages):
+    """classify_building_age 的向量化版本，一次處理整欄屋齡"""
+    ages = np.asarray(ages, dtype=float)
+    labels = np.full(ages.shape, None, dtype=object)
+    labels[~np.isnan(ages)] = "中古屋"
+    labels[(ages > 0) & (ages <= 5)] = "新成屋"
+    labels[ages == 0] = "預售屋"
+    return labels
+
+def roc_dates_to_ages(dates, season_code=None):
+    """
+    將民國完成年月（例如 1050312、0850101 或 10503）換算成屋齡（年）。
+    屋齡以該期數的季末為基準；未指定期數時以今天為基準。
+    完成年月晚於基準（預售）視為 0 年；與基準同月完成視為半個月，歸為新成屋。
+    格式或月份不合理者為 NaN。
+    """
+    text = pd.Series(dates, dtype=object).astype(str).str.strip()
+    lengths = text.str.len().to_numpy()
+    numbers = pd.to_numeric(text.where(text.str.fullmatch(r"\d+", na=False)), errors='coerce').to_numpy(dtype=float)
+    # 依字串長度判斷格式（轉成數字會去掉開頭的 0，例如 0050101）：
+    # 7 碼 年年年月月日日、6 碼 年年月月日日、5 碼 年年年月月
+    has_day = (lengths == 7) | (lengths == 6)
+    known_format = has_day | (lengths == 5)
+    years = np.where(has_day, np.floor(numbers / 10000), np.floor(numbers / 100))
+    months = np.where(has_day, np.floor(numbers / 100) % 100, numbers % 100)
+
+    season_code = convert_season_code_input(season_code) if season_code else None
+    if season_code and len(season_code) == 5 and season_code[3] == 'S':
+        ref_year, ref_month = int(season_code[:3]), int(season_code[-1]) * 3
+    else:
+        today = time.localtime()
+        ref_year, ref_month = today.tm_year - 1911, today.tm_mon
+
+    elapsed_months = (ref_year * 12 + ref_month) - (years * 12 + months)
+    valid = known_format & (months >= 1) & (months <= 12)
+    ages = np.where(elapsed_months < 0, 0, np.maximum(elapsed_months, 0.5) / 12)
+    return np.where(valid, ages, np.nan)
+
 def season_code_to_chinese_quarter(season_code):
     if len(season_code) == 5 and season_code[3] == 'S':
         year = season_code[:3]
@@ -56,6 +115,13 @@ def convert_season_code_for_export(season_code: str) -> str:
         return f"{year}0{quarter}"
     return season_code
 
+def git_blob_sha(content):
+    """在本地計算與 GitHub 相同的 blob sha：sha1(b"blob <長度>\\0" + 內容)"""
+    return hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+
+# 可用環境變數指向其他 API（例如 modules/fake_github.py 的本機替身）
+GITHUB_API_URL = os.environ.get("GITHUB_API_URL", "https://api.github.com")
+
 def github_push_file(repo_owner, repo_name, branch, file_path, commit_message, github_token):
     """
     將本地檔案推送（新增或更新）到 GitHub repo。
@@ -69,7 +135,7 @@ def github_push_file(repo_owner, repo_name, branch, file_path, commit_message, g
     - github_token: GitHub Personal Access Token
     """
     # 目標 repo 的 API URL 路徑
-    api_url = f"https://api.github.com/repos/{repo_owner}/{repo_name}/contents/{os.path.basename(file_path)}"
+    api_url = f"{GITHUB_API_URL}/repos/{repo_owner}/{repo_name}/contents/{os.path.basename(file_path)}"
     
     # 先取得該檔案是否已存在(拿 SHA)
     headers = {
@@ -81,7 +147,7 @@ def github_push_file(repo_owner, repo_name, branch, file_path, commit_message, g
         "ref": branch
     }
     
-    response = requests.get(api_url, headers=headers, params=params)
+    response = http_client.get(api_url, headers=headers, params=params)
     
     if response.status_code == 200:
         # 檔案存在，取得 sha
@@ -94,9 +160,12 @@ def github_push_file(repo_owner, repo_name, branch, file_path, commit_message, g
         print(response.text)
         return False
     
-    # 讀取檔案並 base64 encode
+    # 讀取檔案，內容與遠端相同時不需要再上傳
     with open(file_path, "rb") as f:
         content = f.read()
+    if sha == git_blob_sha(content):
+        print(f"檔案與 GitHub 上相同，略過推送: {file_path}")
+        return True
     content_b64 = base64.b64encode(content).decode()
     
     data = {
@@ -107,7 +176,7 @@ def github_push_file(repo_owner, repo_name, branch, file_path, commit_message, g
     if sha:
         data["sha"] = sha
     
-    put_resp = requests.put(api_url, headers=headers, data=json.dumps(data))
+    put_resp = http_client.put(api_url, headers=headers, data=json.dumps(data))
     
     if put_resp.status_code in [200, 201]:
         print(f"成功推送檔案到 GitHub: {file_path}")
@@ -117,24 +186,177 @@ def github_push_file(repo_owner, repo_name, branch, file_path, commit_message, g
         print(put_resp.text)
         return False
 
-def download_zip(season_code):
+def _github_failed(action, response):
+    print(f"{action}失敗，狀態碼: {response.status_code}")
+    print(response.text)
+    return None
+
+def github_publish_files(repo_owner, repo_name, branch, file_paths, commit_message, github_token,
+                         api_url=None, max_attempts=3):
+    """
+    以 Git Data API 將多個本地檔案一次發佈到 GitHub repo：
+    先取得一次遠端根目錄的檔案清單，與本地計算的 blob sha 比對，只上傳有變動的檔案；
+    變動的檔案組成一個 tree、建立一個 commit，最後只更新一次分支。
+    若分支在這段期間被其他人推進（更新 ref 回傳 422），以新的分支頭重新建立 tree 與 commit。
+
+    回傳新 commit 的 sha；所有檔案都與遠端相同時回傳目前分支頭的 sha；失敗回傳 None。
+    """
+    if not file_paths:
+        print("沒有需要發佈的檔案")
+        return None
+
+    base_url = f"{api_url or GITHUB_API_URL}/repos/{repo_owner}/{repo_name}/git"
+    headers = {
+        "Authorization": f"token {github_token}",
+        "Accept": "application/vnd.github+json"
+    }
+
+    local_shas = {}
+    for file_path in file_paths:
+        with open(file_path, "rb") as f:
+            local_shas[file_path] = git_blob_sha(f.read())
+    # 已上傳的 blob 與分支頭無關，重試時不需要重新上傳
+    uploaded = set()
+
+    for attempt in range(1, max_attempts + 1):
+        resp = http_client.get(f"{base_url}/ref/heads/{branch}", headers=headers)
+        if resp.status_code != 200:
+            return _github_failed("取得分支", resp)
+        head_sha = resp.json()["object"]["sha"]
+
+        resp = http_client.get(f"{base_url}/commits/{head_sha}", headers=headers)
+        if resp.status_code != 200:
+            return _github_failed("取得 commit", resp)
+        base_tree = resp.json()["tree"]["sha"]
+
+        # 統計檔都放在根目錄，一次取得根目錄清單即可比對所有檔案
+        resp = http_client.get(f"{base_url}/trees/{base_tree}", headers=headers)
+        if resp.status_code != 200:
+            return _github_failed("取得檔案清單", resp)
+        remote_shas = {item["path"]: item["sha"] for item in resp.json()["tree"] if item["type"] == "blob"}
+
+        changed = [p for p in file_paths if remote_shas.get(os.path.basename(p)) != local_shas[p]]
+        if not changed:
+            print(f"{len(file_paths)} 個檔案都與遠端相同，不需要建立 commit")
+            return head_sha
+        print(f"{len(changed)} 個檔案有變動，略過 {len(file_paths) - len(changed)} 個相同的檔案")
+
+        entries = []
+        for file_path in changed:
+            if local_shas[file_path] not in uploaded:
+                with open(file_path, "rb") as f:
+                    content_b64 = base64.b64encode(f.read()).decode()
+                resp = http_client.post(f"{base_url}/blobs", headers=headers,
+                                        json={"content": content_b64, "encoding": "base64"})
+                if resp.status_code != 201:
+                    return _github_failed(f"上傳 {file_path} ", resp)
+                uploaded.add(resp.json()["sha"])
+            entries.append({"path": os.path.basename(file_path), "mode": "100644",
+                            "type": "blob", "sha": local_shas[file_path]})
+
+        resp = http_client.post(f"{base_url}/trees", headers=headers,
+                                json={"base_tree": base_tree, "tree": entries})
+        if resp.status_code != 201:
+            return _github_failed("建立 tree", resp)
+        tree_sha = resp.json()["sha"]
+
+        resp = http_client.post(f"{base_url}/commits", headers=headers,
+                                json={"message": commit_message, "tree": tree_sha, "parents": [head_sha]})
+        if resp.status_code != 201:
+            return _github_failed("建立 commit", resp)
+        commit_sha = resp.json()["sha"]
+
+        resp = http_client.patch(f"{base_url}/refs/heads/{branch}", headers=headers,
+                                 json={"sha": commit_sha, "force": False})
+        if resp.status_code == 200:
+            print(f"成功以單一 commit 發佈 {len(entries)} 個檔案到 GitHub: {commit_sha[:7]}")
+            return commit_sha
+        if resp.status_code != 422:
+            return _github_failed("更新分支", resp)
+        print(f"分支已被更新，重新建立 commit（第 {attempt} 次）")
+
+    print(f"分支持續變動，{max_attempts} 次後放棄發佈")
+    return None
+
+def is_valid_zip(zip_path):
+    """檢查 ZIP 檔是否完整（逐一驗證成員的 CRC）"""
+    if not os.path.exists(zip_path):
+        return False
+    try:
+        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            return zip_ref.testzip() is None
+    except (zipfile.BadZipFile, OSError):
+        return False
+
+def download_zip(season_code, max_retries=5, chunk_size=1024 * 1024):
+    """
+    以串流方式下載內政部季資料 ZIP。
+
+    - 分塊寫入暫存檔 (.part)，不會把整個檔案放進記憶體
+    - 連線中斷時以 HTTP Range 從暫存檔尾端續傳
+    - 下載完成後檢查檔案大小與 CRC，再以原子方式改名
+    - 若 ./data/moi_data_<season>.zip 已存在且完整，直接沿用
+    """
     base_url = "https://plvr.land.moi.gov.tw/DownloadSeason"
     params = {
         "season": season_code,
         "type": "zip",
         "fileName": "lvr_landcsv.zip"
     }
-    response = requests.get(base_url, params=params, stream=True)
+    os.makedirs("data", exist_ok=True)
+    zip_path = f"./data/moi_data_{season_code}.zip"
+    part_path = zip_path + ".part"
 
-    if response.status_code == 200:
-        os.makedirs("data", exist_ok=True)
-        zip_path = f"./data/moi_data_{season_code}.zip"
-        with open(zip_path, "wb") as f:
-            f.write(response.content)
+    if is_valid_zip(zip_path):
+        print(f"♻️ 沿用已下載的檔案：{zip_path}")
+        return zip_path
+
+    last_error = None
+    for attempt in range(1, max_retries + 1):
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        try:
+            with http_client.get(base_url, params=params, headers=headers, stream=True, timeout=(10, 60)) as response:
+                if response.status_code == 416:
+                    # 暫存檔已是完整長度，伺服器沒有剩餘內容可傳
+                    expected_size = offset
+                elif response.status_code in (200, 206):
+                    if response.status_code == 206:
+                        total = response.headers.get("Content-Range", "").rsplit("/", 1)[-1]
+                        mode = "ab"
+                    else:
+                        # 伺服器不支援續傳，從頭開始
+                        total = response.headers.get("Content-Length", "")
+                        mode = "wb"
+                    expected_size = int(total) if total.isdigit() else None
+                    with open(part_path, mode) as f:
+                        for chunk in response.iter_content(chunk_size=chunk_size):
+                            if chunk:
+                                f.write(chunk)
+                else:
+                    raise Exception(f"下載失敗，狀態碼：{response.status_code}")
+        except requests.exceptions.RequestException as e:
+            last_error = e
+            print(f"⚠️ 第 {attempt} 次下載 {season_code} 中斷：{e}，將嘗試續傳")
+            continue
+
+        size = os.path.getsize(part_path)
+        if expected_size is not None and size != expected_size:
+            last_error = f"檔案大小不符：預期 {expected_size}，實際 {size}"
+            print(f"⚠️ {last_error}，將嘗試續傳")
+            continue
+        if not is_valid_zip(part_path):
+            # 內容損毀，丟棄暫存檔後重新下載
+            os.remove(part_path)
+            last_error = "ZIP 檔 CRC 驗證失敗"
+            print(f"⚠️ {last_error}，重新下載")
+            continue
+
+        os.replace(part_path, zip_path)
         print(f"✅ 已下載：{zip_path}")
         return zip_path
-    else:
-        raise Exception(f"下載失敗，狀態碼：{response.status_code}")
+
+    raise Exception(f"下載失敗：{last_error}")
 
 def unzip_file(zip_path, extract_to):
     os.makedirs(extract_to, exist_ok=True)
@@ -142,143 +364,438 @@ def unzip_file(zip_path, extract_to):
         zip_ref.extractall(extract_to)
     print(f"✅ 已解壓縮至：{extract_to}")
 
-def process_real_estate_data(data_folder_path):
-    all_data = []
-    
-    land_files = glob.glob(os.path.join(data_folder_path, "*_lvr_land_*.csv"))
-    
-    for land_file in land_files:
-        filename = os.path.basename(land_file)
-        city_code = filename[0].lower()
-        
-        if city_code not in city_code_map:
-            print(f"警告: 未知的城市代碼 {city_code} 在檔案 {filename}")
-            continue
-        
-        city_name = city_code_map[city_code]
-        build_file = land_file.replace('.csv', '_build.csv')
-        
-        if not os.path.exists(build_file):
-            print(f"警告: 找不到對應的建物檔案 {build_file}")
-            continue
-        
-        try:
-            print(f"處理 {city_name} 的資料...")
-            land_df = pd.read_csv(land_file)
-            build_df = pd.read_csv(build_file)
-            
-            land_df.columns = land_df.columns.str.strip()
-            build_df.columns = build_df.columns.str.strip()
-            
-            serial_columns = ['編號', 'The serial number', '序號']
-            land_serial_col = next((col for col in serial_columns if col in land_df.columns), None)
-            build_serial_col = next((col for col in serial_columns if col in build_df.columns), None)
-            
-            if land_serial_col is None or build_serial_col is None:
-                print(f"警告: 無法找到編號欄位在檔案 {filename}")
-                continue
-            
-            district_col = next((col for col in ['鄉鎮市區', '行政區'] if col in land_df.columns), None)
-            price_col = next((col for col in ['單價元平方公尺', '平方公尺單價(元)', '單價(元/平方公尺)'] if col in land_df.columns), None)
-            age_col = next((col for col in ['屋齡', 'room age', '建物完成年月'] if col in build_df.columns), None)
-            target_col = next((col for col in ['交易標的'] if col in land_df.columns), None)
-            zone_col = next((col for col in ['都市土地使用分區'] if col in land_df.columns), None)
-            
-            if None in [district_col, price_col, age_col, target_col, zone_col]:
-                print(f"警告: 必要欄位缺失，跳過檔案 {filename}")
-                continue
-            
-            land_df_filtered = land_df[land_df[target_col] != '車位']
-            land_df_filtered = land_df_filtered[land_df_filtered[zone_col].str.contains('住', na=False)]
-            
-            merged_df = pd.merge(
-                land_df_filtered[[land_serial_col, district_col, price_col]],
-                build_df[[build_serial_col, age_col]],
-                left_on=land_serial_col,
-                right_on=build_serial_col,
-                how='inner'
-            )
-            
-            merged_df = merged_df.dropna(subset=[age_col])
-            
-            merged_df[price_col] = pd.to_numeric(merged_df[price_col], errors='coerce')
-            merged_df[age_col] = pd.to_numeric(merged_df[age_col], errors='coerce')
-            
-            merged_df = merged_df[(merged_df[price_col] > 0) & (merged_df[price_col].notna())]
-            
-            merged_df['縣市'] = city_name
-            merged_df['BUILD'] = merged_df[age_col].apply(classify_building_age)
-            
-            merged_df = merged_df.rename(columns={
-                district_col: '行政區',
-                price_col: '單價元平方公尺'
-            })
-            
-            final_df = merged_df[['縣市', '行政區', 'BUILD', '單價元平方公尺']].copy()
-            all_data.append(final_df)
-            
-        except Exception as e:
-            print(f"錯誤: 處理檔案 {filename} 時發生錯誤: {e}")
-            continue
-    
+# 逐筆交易封存檔的欄位
+TRANSACTION_COLUMNS = ['縣市', '行政區', 'BUILD', '單價元平方公尺', '屋齡', '編號']
+
+# 各欄位可能出現的名稱（不同期數的欄位名稱不一定相同）
+LAND_COLUMN_ALIASES = {
+    'serial': ['編號', 'The serial number', '序號'],
+    'district': ['鄉鎮市區', '行政區'],
+    'price': ['單價元平方公尺', '平方公尺單價(元)', '單價(元/平方公尺)'],
+    'target': ['交易標的'],
+    'zone': ['都市土地使用分區'],
+}
+BUILD_COLUMN_ALIASES = {
+    'serial': ['編號', 'The serial number', '序號'],
+    'age': ['屋齡', 'room age', '建物完成年月'],
+}
+
+def sniff_columns(open_member, name, aliases):
+    """
+    只讀取表頭與第一列，依別名找出需要的欄位。
+    回傳 ({欄位代號: 原始欄位名稱或 None}, 第一列是否為英文表頭)
+    """
+    with open_member(name) as f:
+        head = pd.read_csv(f, nrows=1, dtype=str)
+    stripped = {col.strip(): col for col in head.columns}
+    resolved = {
+        key: next((stripped[alias] for alias in candidates if alias in stripped), None)
+        for key, candidates in aliases.items()
+    }
+
+    # 內政部的 CSV 在中文表頭下還有一列英文表頭，例如 "serial number"
+    has_english = False
+    serial_col = resolved.get('serial')
+    if serial_col is not None and len(head) > 0:
+        first_serial = str(head[serial_col].iloc[0]).strip().lower()
+        has_english = 'serial' in first_serial
+    return resolved, has_english
+
+def load_columns(open_member, name, resolved, dtypes, skip_english):
+    """只載入 sniff_columns 找到的欄位，並指定型別；欄位會改名為欄位代號"""
+    columns = {raw: key for key, raw in resolved.items() if raw is not None}
+    typed = {raw: dtypes[key] for raw, key in columns.items() if key in dtypes}
+    skiprows = [1] if skip_english else None
+    try:
+        with open_member(name) as f:
+            df = pd.read_csv(f, usecols=list(columns), dtype=typed, skiprows=skiprows)
+    except ValueError:
+        # 數值欄位混有文字時，先以字串讀入再轉成數值（無法轉換者為 NaN）
+        numeric = [raw for raw, dtype in typed.items() if dtype == 'float64']
+        fallback = {raw: (str if raw in numeric else dtype) for raw, dtype in typed.items()}
+        with open_member(name) as f:
+            df = pd.read_csv(f, usecols=list(columns), dtype=fallback, skiprows=skiprows)
+        for raw in numeric:
+            df[raw] = pd.to_numeric(df[raw], errors='coerce')
+    return df.rename(columns=columns)
+
+@contextlib.contextmanager
+def open_data_source(data_source):
+    """
+    開啟資料來源（解壓縮後的資料夾或季資料 ZIP 檔），
+    回傳 (所有 CSV 名稱, 開啟單一 CSV 的函式)
+    """
+    if os.path.isfile(data_source) and zipfile.is_zipfile(data_source):
+        with zipfile.ZipFile(data_source, 'r') as zip_ref:
+            yield zip_ref.namelist(), zip_ref.open
+    else:
+        member_names = [os.path.join(data_source, os.path.basename(path))
+                        for path in glob.glob(os.path.join(data_source, "*.csv"))]
+        yield member_names, lambda name: open(name, 'rb')
+
+def process_real_estate_data(data_source, season_code=None, city_workers=None):
+    """統計各縣市、行政區、屋齡類別的平均單價與交易筆數（參數同 merge_transactions）"""
+    transactions = merge_transactions(data_source, season_code, city_workers)
+    if transactions is None:
+        return None
+    return aggregate_transactions(transactions)
+
+def merge_transactions(data_source, season_code=None, city_workers=None):
+    """
+    合併各縣市的土地與建物資料，回傳逐筆交易
+    （縣市、行政區、BUILD、單價元平方公尺、屋齡、編號），全部失敗時為 None。
+
+    data_source 可以是解壓縮後的資料夾，也可以直接是季資料 ZIP 檔；
+    ZIP 檔只會讀取其中的 *_lvr_land_*.csv 與對應的 *_build.csv，不需先解壓縮。
+    season_code 用來把建物完成年月換算成該期的屋齡。
+    city_workers 大於 1 時，以行程池同時處理多個縣市。
+    """
+    with open_data_source(data_source) as (member_names, open_member):
+        available = set(member_names)
+        land_files = [name for name in member_names
+                      if fnmatch.fnmatch(os.path.basename(name), "*_lvr_land_*.csv")]
+
+        if city_workers and city_workers > 1:
+            with ProcessPoolExecutor(max_workers=city_workers) as executor:
+                results = list(executor.map(
+                    _process_city_task,
+                    [(data_source, land_file, available, season_code) for land_file in land_files],
+                ))
+        else:
+            results = [_process_city_files(land_file, available, open_member, season_code)
+                       for land_file in land_files]
+
+    all_data = [result for result in results if result is not None]
+
     if not all_data:
         print("錯誤: 沒有成功處理任何檔案")
         return None
-    
+
     combined_df = pd.concat(all_data, ignore_index=True)
-    combined_df = combined_df.dropna(subset=['BUILD'])
-    
-    result_df = combined_df.groupby(['縣市', '行政區', 'BUILD']).agg({
+    return combined_df.dropna(subset=['BUILD'])
+
+def aggregate_transactions(combined_df):
+    """將逐筆交易彙總成 合併後不動產統計 的格式"""
+    result_df = combined_df.groupby(['縣市', '行政區', 'BUILD'], observed=True).agg({
         '單價元平方公尺': ['mean', 'count']
     }).round(2)
-    
+
     result_df.columns = ['平均單價元平方公尺', '交易筆數']
     result_df = result_df.reset_index()
     return result_df
 
-def main(season_code):
-    season_code_2 = convert_season_code_input(season_code)  # 加這行做轉換
+def _process_city_task(args):
+    """行程池用：在工作行程中自行開啟資料來源後處理單一縣市"""
+    data_source, land_file, available, season_code = args
+    with open_data_source(data_source) as (_, open_member):
+        return _process_city_files(land_file, available, open_member, season_code)
 
-    zip_path = download_zip(season_code_2)
-    extract_to = f"./data/lvr_landcsv_{season_code_2}"
-    unzip_file(zip_path, extract_to)
-
-    result = process_real_estate_data(extract_to)
-    if result is not None:
-        quarter_str = season_code_to_chinese_quarter(season_code_2)
-        result['季度'] = [quarter_str] * len(result)
-
-        os.makedirs("output", exist_ok=True)
-        export_season_code = convert_season_code_for_export(season_code_2)
-        output_file = f"./output/合併後不動產統計_{export_season_code}.csv"
-        result.to_csv(output_file, index=False, encoding='utf-8-sig')
-        print(f"📄 統計完成，已輸出: {output_file}")
-
-        repo_owner = "ericeeic"
-        repo_name = "STUDENT_PROJECT"
-        branch = "main"
-        commit_message = f"更新統計資料 {season_code_2}"
-        github_token = os.environ.get("GITHUB_TOKEN")
-
-        if github_token:
-            github_push_file(repo_owner, repo_name, branch, output_file, commit_message, github_token)
+def _process_city_files(land_file, available, open_member, season_code=None):
+    """處理單一縣市的土地檔與建物檔，回傳合併後的交易資料（失敗時為 None）"""
+    filename = os.path.basename(land_file)
+    city_code = filename[0].lower()
+
+    if city_code not in city_code_map:
+        print(f"警告: 未知的城市代碼 {city_code} 在檔案 {filename}")
+        return None
+
+    city_name = city_code_map[city_code]
+    build_file = land_file.replace('.csv', '_build.csv')
+
+    if build_file not in available:
+        print(f"警告: 找不到對應的建物檔案 {build_file}")
+        return None
+
+    try:
+        print(f"處理 {city_name} 的資料...")
+        land_cols, land_has_english = sniff_columns(open_member, land_file, LAND_COLUMN_ALIASES)
+        build_cols, build_has_english = sniff_columns(open_member, build_file, BUILD_COLUMN_ALIASES)
+
+        land_serial_col = land_cols['serial']
+        build_serial_col = build_cols['serial']
+
+        if land_serial_col is None or build_serial_col is None:
+            print(f"警告: 無法找到編號欄位在檔案 {filename}")
+            return None
+
+        district_col = land_cols['district']
+        price_col = land_cols['price']
+        age_col = build_cols['age']
+        target_col = land_cols['target']
+        zone_col = land_cols['zone']
+
+        if None in [district_col, price_col, age_col, target_col, zone_col]:
+            print(f"警告: 必要欄位缺失，跳過檔案 {filename}")
+            return None
+
+        land_df = load_columns(open_member, land_file, land_cols, {
+            'serial': str, 'district': 'category', 'price': 'float64',
+            'target': 'category', 'zone': 'category',
+        }, land_has_english)
+        # 建物完成年月是民國日期字串（例如 0850101），需保留前導 0
+        age_dtype = str if age_col == '建物完成年月' else 'float64'
+        build_df = load_columns(open_member, build_file, build_cols, {
+            'serial': str, 'age': age_dtype,
+        }, build_has_english)
+
+        land_df_filtered = land_df[land_df['target'] != '車位']
+        land_df_filtered = land_df_filtered[land_df_filtered['zone'].str.contains('住', na=False)]
+
+        merged_df = pd.merge(
+            land_df_filtered[['serial', 'district', 'price']],
+            build_df[['serial', 'age']],
+            on='serial',
+            how='inner'
+        )
+
+        merged_df = merged_df.dropna(subset=['age'])
+
+        if age_col == '建物完成年月':
+            merged_df['age'] = roc_dates_to_ages(merged_df['age'], season_code)
         else:
-            print("❌ 找不到 GITHUB_TOKEN，請確認是否有設定環境變數")
+            merged_df['age'] = pd.to_numeric(merged_df['age'], errors='coerce')
+
+        merged_df = merged_df[(merged_df['price'] > 0) & (merged_df['price'].notna())]
+
+        merged_df['縣市'] = city_name
+        merged_df['BUILD'] = classify_building_ages(merged_df['age'])
+
+        merged_df = merged_df.rename(columns={
+            'district': '行政區',
+            'price': '單價元平方公尺',
+            'age': '屋齡',
+            'serial': '編號',
+        })
+
+        return merged_df[TRANSACTION_COLUMNS].copy()
+
+    except Exception as e:
+        print(f"錯誤: 處理檔案 {filename} 時發生錯誤: {e}")
+        return None
+
+# 平行回補時，各個工作行程共用的下載名額（限制同時連到內政部的連線數）
+_download_slots = None
+
+def build_season(season_code, extract=False, city_workers=None):
+    """
+    下載並統計單一期數，回傳輸出的 CSV 路徑（處理失敗時為 None）
+    預設直接從 ZIP 讀取需要的 CSV；extract=True 時才解壓縮到 ./data/lvr_landcsv_<期數>
+    city_workers 大於 1 時同時處理多個縣市
+    """
+    season_code_2 = convert_season_code_input(season_code)  # 加這行做轉換
+
+    with _download_slots if _download_slots is not None else contextlib.nullcontext():
+        zip_path = download_zip(season_code_2)
+
+    if extract:
+        extract_to = f"./data/lvr_landcsv_{season_code_2}"
+        unzip_file(zip_path, extract_to)
+        transactions = merge_transactions(extract_to, season_code_2, city_workers)
     else:
+        transactions = merge_transactions(zip_path, season_code_2, city_workers)
+    if transactions is None:
         print("⚠️ 資料處理失敗")
+        return None
 
-if __name__ == "__main__":
-    season = input("請輸入欲下載的期數（例如：114S2）：").strip()
-    main(season)
+    export_season_code = convert_season_code_for_export(season_code_2)
+    archive_path = write_transactions(transactions, export_season_code)
+    print(f"🗜️ 已封存逐筆交易: {archive_path}")
+    write_season_sketches(transactions, export_season_code)
+
+    return export_season_result(aggregate_transactions(transactions), season_code_2)
+
+def export_season_result(result, season_code):
+    """輸出單一期數的統計結果（CSV、分區資料集、行政區價格圖層），回傳 CSV 路徑"""
+    season_code_2 = convert_season_code_input(season_code)
+    quarter_str = season_code_to_chinese_quarter(season_code_2)
+    result['季度'] = [quarter_str] * len(result)
+
+    os.makedirs("output", exist_ok=True)
+    export_season_code = convert_season_code_for_export(season_code_2)
+    output_file = f"./output/合併後不動產統計_{export_season_code}.csv"
+    result.to_csv(output_file, index=False, encoding='utf-8-sig')
+    print(f"📄 統計完成，已輸出: {output_file}")
+
+    partition_path = write_season(result, export_season_code)
+    print(f"🗂️ 已寫入分區資料集: {partition_path}")
+
+    try:
+        geojson_path = write_season_geojson(result, export_season_code)
+        print(f"🗺️ 已輸出行政區價格圖層: {geojson_path}")
+    except OSError as e:
+        print(f"⚠️ 行政區價格圖層輸出失敗: {e}")
+    return output_file
+
+def reaggregate(seasons=None):
+    """
+    從逐筆交易封存檔重新產生各期的 合併後不動產統計 輸出，不需重新下載。
+    seasons 為 None 時處理所有已封存的期數，回傳輸出的 CSV 路徑。
+    """
+    seasons = seasons if seasons is not None else stored_seasons(TRANSACTION_ROOT)
+    outputs = []
+    for season_code in seasons:
+        try:
+            transactions = load_season(season_code, TRANSACTION_ROOT, columns=TRANSACTION_COLUMNS)
+        except (FileNotFoundError, ValueError) as e:
+            print(f"⚠️ 期數 {season_code} 沒有可用的封存檔: {e}")
+            continue
+        write_season_sketches(transactions, season_code)
+        outputs.append(export_season_result(aggregate_transactions(transactions), season_code))
+    return outputs
 
+def write_season_sketches(transactions, season_code):
+    """寫入單一期數的單價分位數草圖，之後可跨季、跨行政區合併查詢中位數等分位數"""
+    sketch_path = write_season(build_sketches(transactions), season_code, SKETCH_ROOT, compression="zstd")
+    print(f"📐 已寫入分位數草圖: {sketch_path}")
+    return sketch_path
 
+PUBLISH_REPO_OWNER = "ericeeic"
+PUBLISH_REPO_NAME = "STUDENT_PROJECT"
+PUBLISH_BRANCH = "main"
 
+def push_output(output_file, season_code):
+    commit_message = f"更新統計資料 {convert_season_code_input(season_code)}"
+    github_token = os.environ.get("GITHUB_TOKEN")
 
+    if github_token:
+        return github_push_file(PUBLISH_REPO_OWNER, PUBLISH_REPO_NAME, PUBLISH_BRANCH,
+                                output_file, commit_message, github_token)
+    print("❌ 找不到 GITHUB_TOKEN，請確認是否有設定環境變數")
+    return False
 
+def push_outputs(output_files, seasons):
+    """回補完成後，把所有期數的統計檔以單一 commit 發佈"""
+    seasons = sorted(seasons)
+    if len(seasons) == 1:
+        commit_message = f"更新統計資料 {convert_season_code_input(seasons[0])}"
+    else:
+        first, last = convert_season_code_input(seasons[0]), convert_season_code_input(seasons[-1])
+        commit_message = f"更新統計資料 {first}～{last}（{len(seasons)} 期）"
+    github_token = os.environ.get("GITHUB_TOKEN")
 
+    if github_token:
+        return github_publish_files(PUBLISH_REPO_OWNER, PUBLISH_REPO_NAME, PUBLISH_BRANCH,
+                                    output_files, commit_message, github_token)
+    print("❌ 找不到 GITHUB_TOKEN，請確認是否有設定環境變數")
+    return None
 
+def main(season_code, push=True, extract=False, city_workers=None):
+    output_file = build_season(season_code, extract=extract, city_workers=city_workers)
+    if output_file is not None and push:
+        push_output(output_file, season_code)
+    return output_file
 
+def season_range(start, end):
+    """
+    產生起訖之間（含）的所有期數，格式為 5 碼
+    例如：season_range("11303", "11402") -> ["11303", "11304", "11401", "11402"]
+    """
+    start = convert_season_code_for_export(convert_season_code_input(start))
+    end = convert_season_code_for_export(convert_season_code_input(end))
+    year, quarter = int(start[:3]), int(start[3:])
+    end_year, end_quarter = int(end[:3]), int(end[3:])
+    seasons = []
+    while (year, quarter) <= (end_year, end_quarter):
+        seasons.append(f"{year:03d}{quarter:02d}")
+        quarter += 1
+        if quarter > 4:
+            year, quarter = year + 1, 1
+    return seasons
 
+def _init_backfill_worker(download_slots):
+    global _download_slots
+    _download_slots = download_slots
+    # 進度訊息一律寫到 stderr，stdout 只留給回補摘要
+    sys.stdout = sys.stderr
 
+def _backfill_one(season_code, extract, city_workers):
+    started = time.time()
+    try:
+        # 各期不在子行程各自推送，全部完成後再一次發佈
+        output_file = main(season_code, push=False, extract=extract, city_workers=city_workers)
+        status = "ok" if output_file else "failed"
+        error = None if output_file else "資料處理失敗"
+    except Exception as e:
+        output_file, status, error = None, "failed", str(e)
+    return {
+        "season": season_code,
+        "status": status,
+        "output": output_file,
+        "error": error,
+        "seconds": round(time.time() - started, 2),
+    }
 
+def backfill(seasons, workers=4, max_downloads=2, push=False, extract=False, city_workers=None):
+    """
+    以行程池平行處理多個期數（下載、解壓縮、統計）。
+    同時下載的數量受 max_downloads 限制。進度訊息都寫到 stderr。
+    push 為 True 時，成功的期數在最後以單一 commit 發佈到 GitHub。
+
+    回傳 (每一期的處理結果, 發佈結果)；發佈結果在未要求 push 時為 None，
+    否則為 {"status": "ok" / "failed" / "skipped", "commit": commit sha 或 None}。
+    """
+    download_slots = multiprocessing.get_context().BoundedSemaphore(max_downloads)
+    results = []
+    publish = None
+    with contextlib.redirect_stdout(sys.stderr):
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_backfill_worker,
+                                 initargs=(download_slots,)) as executor:
+            futures = {executor.submit(_backfill_one, season, extract, city_workers): season for season in seasons}
+            for future in as_completed(futures):
+                result = future.result()
+                mark = "✅" if result["status"] == "ok" else "❌"
+                print(f"{mark} {result['season']} ({result['seconds']} 秒)")
+                results.append(result)
+        results = sorted(results, key=lambda r: r["season"])
+
+        succeeded = [r for r in results if r["status"] == "ok"]
+        if push and succeeded:
+            commit = push_outputs([r["output"] for r in succeeded], [r["season"] for r in succeeded])
+            publish = {"status": "ok" if commit else "failed", "commit": commit}
+        elif push:
+            publish = {"status": "skipped", "commit": None}
+    return results, publish
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="下載並統計內政部實價登錄季資料")
+    parser.add_argument("season", nargs="?", help="單一期數，例如 114S2 或 11402")
+    parser.add_argument("--from", dest="start", help="回補起始期數，例如 10103")
+    parser.add_argument("--to", dest="end", help="回補結束期數，例如 11402")
+    parser.add_argument("--workers", type=int, default=4, help="同時處理的期數")
+    parser.add_argument("--max-downloads", type=int, default=2, help="同時下載的連線數上限")
+    parser.add_argument("--city-workers", type=int, default=None, help="每一期同時處理的縣市數")
+    parser.add_argument("--push", action="store_true", help="回補完成後推送到 GitHub")
+    parser.add_argument("--extract", action="store_true", help="先將 ZIP 解壓縮到 ./data 再處理")
+    parser.add_argument("--reaggregate", action="store_true",
+                        help="從逐筆交易封存檔重新產生統計（可搭配 --from/--to，預設全部期數）")
+    parser.add_argument("--summary", help="將處理結果以 JSON 寫入此檔案（預設輸出到 stdout，進度訊息一律寫到 stderr）")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.reaggregate:
+        seasons = season_range(args.start or args.end, args.end or args.start) if (args.start or args.end) else None
+        for output_file in reaggregate(seasons):
+            print(output_file)
+    elif args.start or args.end:
+        seasons = season_range(args.start or args.end, args.end or args.start)
+        results, publish = backfill(seasons, workers=args.workers, max_downloads=args.max_downloads,
+                                    push=args.push, extract=args.extract, city_workers=args.city_workers)
+        summary = {
+            "total": len(results),
+            "succeeded": sum(r["status"] == "ok" for r in results),
+            "failed": [r["season"] for r in results if r["status"] != "ok"],
+            "publish": publish,
+            "seasons": results,
+        }
+        summary_json = json.dumps(summary, ensure_ascii=False, indent=2)
+        if args.summary:
+            with open(args.summary, "w", encoding="utf-8") as f:
+                f.write(summary_json)
+        else:
+            print(summary_json)
+        publish_failed = publish is not None and publish["status"] == "failed"
+        sys.exit(1 if summary["failed"] or publish_failed else 0)
+    else:
+        season = args.season or input("請輸入欲下載的期數（例如：114S2）：").strip()
+        main(season, extract=args.extract, city_workers=args.city_workers)
@@ -0,0 +1,233 @@
+import os
+import re
+import glob
+import threading
+import time
+import numpy as np
+import pandas as pd
+
+# 以 年/季 分區的 Parquet 資料集，例如 ./data/seasons/year=114/quarter=2/part-0.parquet
+STORE_ROOT = "./data/seasons"
+# 逐筆交易的封存檔，分區方式相同
+TRANSACTION_ROOT = "./data/transactions"
+# 每期各 (縣市, 行政區, BUILD) 的單價分位數草圖
+SKETCH_ROOT = "./data/sketches"
+
+CSV_PATTERN = re.compile(r"合併後不動產統計_(\d{3})(0[1-4])\.csv$")
+
+def parse_season(season_code):
+    """將 11402 或 114S2 轉成 (114, 2)"""
+    match = re.fullmatch(r"(\d{3})(?:S|0)([1-4])", season_code)
+    if not match:
+        raise ValueError(f"無法辨識的期數：{season_code}")
+    return int(match.group(1)), int(match.group(2))
+
+def season_partition_path(season_code, root=STORE_ROOT):
+    year, quarter = parse_season(season_code)
+    return os.path.join(root, f"year={year}", f"quarter={quarter}", "part-0.parquet")
+
+def write_season(df, season_code, root=STORE_ROOT, compression="snappy"):
+    """寫入（或覆蓋）單一期數的分區"""
+    path = season_partition_path(season_code, root)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    df.to_parquet(tmp_path, index=False, compression=compression)
+    os.replace(tmp_path, path)
+    return path
+
+def write_transactions(df, season_code, root=TRANSACTION_ROOT):
+    """封存單一期數的逐筆交易（文字欄位轉類別，以 zstd 壓縮）"""
+    df = df.copy()
+    for col in ("縣市", "行政區", "BUILD"):
+        df[col] = df[col].astype(str).astype("category")
+    return write_season(df, season_code, root, compression="zstd")
+
+def stored_seasons(root=STORE_ROOT):
+    """列出資料集中已有的期數（5 碼格式）"""
+    seasons = []
+    for path in glob.glob(os.path.join(root, "year=*", "quarter=*", "part-0.parquet")):
+        quarter_dir = os.path.dirname(path)
+        year = os.path.basename(os.path.dirname(quarter_dir)).split("=", 1)[1]
+        quarter = os.path.basename(quarter_dir).split("=", 1)[1]
+        seasons.append(f"{int(year):03d}0{int(quarter)}")
+    return sorted(seasons)
+
+def sync_from_csv(folder="./", root=STORE_ROOT):
+    """
+    將資料夾內的 合併後不動產統計_*.csv 匯入資料集。
+    只處理資料集中沒有、或 CSV 比分區新的期數，回傳這次匯入的期數。
+    """
+    imported = []
+    for fname in sorted(os.listdir(folder)):
+        match = CSV_PATTERN.match(fname)
+        if not match:
+            continue
+        season_code = match.group(1) + match.group(2)
+        csv_path = os.path.join(folder, fname)
+        part_path = season_partition_path(season_code, root)
+        if os.path.exists(part_path) and os.path.getmtime(part_path) >= os.path.getmtime(csv_path):
+            continue
+        try:
+            write_season(pd.read_csv(csv_path), season_code, root)
+            imported.append(season_code)
+        except Exception as e:
+            print(f"匯入 {fname} 失敗：{e}")
+    return imported
+
+def load_seasons(root=STORE_ROOT, columns=None, years=None, quarters=None, cities=None):
+    """
+    讀取資料集，只載入需要的分區與欄位。
+
+    - columns: 要讀取的欄位，None 表示全部
+    - years / quarters: 民國年與季的清單，用來挑選分區
+    - cities: 縣市清單
+    """
+    if not stored_seasons(root):
+        return pd.DataFrame(columns=columns or [])
+
+    filters = []
+    if years is not None:
+        filters.append(("year", "in", [int(y) for y in years]))
+    if quarters is not None:
+        filters.append(("quarter", "in", [int(q) for q in quarters]))
+    if cities is not None:
+        filters.append(("縣市", "in", list(cities)))
+
+    df = pd.read_parquet(root, columns=columns, filters=filters or None)
+    # 分區欄位讀回來是類別型別，轉回整數
+    for col in ("year", "quarter"):
+        if col in df.columns:
+            df[col] = df[col].astype(int)
+    return df
+
+def load_season(season_code, root=STORE_ROOT, columns=None):
+    """直接讀取單一期數的分區檔，並補上 year / quarter 欄位"""
+    year, quarter = parse_season(season_code)
+    file_columns = [c for c in columns if c not in ("year", "quarter")] if columns else None
+    df = pd.read_parquet(season_partition_path(season_code, root), columns=file_columns)
+    if columns is None or "year" in columns:
+        df["year"] = year
+    if columns is None or "quarter" in columns:
+        df["quarter"] = quarter
+    return df
+
+CATEGORY_COLUMNS = ["縣市", "行政區", "BUILD", "季度"]
+
+def compact_frame(df):
+    """
+    轉成精簡的記憶體表示：文字欄位改為類別型別，整數欄位縮小，
+    並加上整數期數鍵 season_key（例如 11402）。
+    單價維持 float64，避免加權平均時累積誤差。
+    """
+    df = df.copy()
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype(str).astype("category")
+    if "交易筆數" in df.columns:
+        df["交易筆數"] = pd.to_numeric(df["交易筆數"], downcast="integer")
+    if "year" in df.columns and "quarter" in df.columns:
+        df["year"] = df["year"].astype("int16")
+        df["quarter"] = df["quarter"].astype("int8")
+        df["season_key"] = (df["year"].astype("int32") * 100 + df["quarter"]).astype("int32")
+    return df
+
+class SelectionIndex:
+    """
+    縣市 / (縣市, 行政區) 的選取索引，每個資料版本建立一次。
+    資料依 (縣市, 行政區) 排序後，每個選擇都對應一段連續的列，
+    select() 直接切出該段，不需要複製整個資料表再做布林篩選。
+    """
+
+    def __init__(self, df):
+        self.ranges = {}
+        if len(df) == 0 or not isinstance(df["縣市"].dtype, pd.CategoricalDtype):
+            self.df = df
+            return
+
+        city_codes = df["縣市"].cat.codes.to_numpy()
+        district_codes = df["行政區"].cat.codes.to_numpy()
+        # 穩定排序，同一行政區內維持原本的期數順序
+        order = np.lexsort((district_codes, city_codes))
+        self.df = df.iloc[order].reset_index(drop=True)
+        city_codes = city_codes[order]
+        district_codes = district_codes[order]
+
+        cities = self.df["縣市"].cat.categories
+        districts = self.df["行政區"].cat.categories
+        n = len(self.df)
+
+        city_starts = np.flatnonzero(np.r_[True, city_codes[1:] != city_codes[:-1]])
+        for start, stop in zip(city_starts, np.r_[city_starts[1:], n]):
+            self.ranges[(cities[city_codes[start]], None)] = (int(start), int(stop))
+
+        pair_changed = (city_codes[1:] != city_codes[:-1]) | (district_codes[1:] != district_codes[:-1])
+        pair_starts = np.flatnonzero(np.r_[True, pair_changed])
+        for start, stop in zip(pair_starts, np.r_[pair_starts[1:], n]):
+            key = (cities[city_codes[start]], districts[district_codes[start]])
+            self.ranges[key] = (int(start), int(stop))
+
+    def select(self, city=None, district=None):
+        """回傳該選擇的資料（連續區段的切片，不複製資料）"""
+        if city is None:
+            return self.df
+        start, stop = self.ranges.get((city, district), (0, 0))
+        return self.df.iloc[start:stop]
+
+def store_fingerprint(root=STORE_ROOT):
+    """每個期數分區的 (修改時間, 大小)，用來判斷哪些期數需要重新讀取"""
+    fingerprint = {}
+    for season_code in stored_seasons(root):
+        stat = os.stat(season_partition_path(season_code, root))
+        fingerprint[season_code] = (stat.st_mtime_ns, stat.st_size)
+    return fingerprint
+
+class DatasetCache:
+    """
+    整個行程共用的合併資料快取，以各期分區的指紋為鍵。
+    新增期數時只讀取並附加該期，其餘期數沿用記憶體中的資料。
+    """
+
+    def __init__(self, root=STORE_ROOT, columns=None):
+        self.root = root
+        self.columns = columns
+        self.fingerprint = {}
+        self.parts = {}
+        self.combined = None
+        # 資料有變動時遞增，讓依賴資料的衍生結構（例如價格立方體）知道要重建
+        self.version = 0
+        self.lock = threading.Lock()
+
+    def get(self):
+        with self.lock:
+            started = time.perf_counter()
+            fingerprint = store_fingerprint(self.root)
+            changed = [s for s, stamp in fingerprint.items() if self.fingerprint.get(s) != stamp]
+            removed = [s for s in self.fingerprint if s not in fingerprint]
+
+            if not changed and not removed and self.combined is not None:
+                elapsed = (time.perf_counter() - started) * 1000
+                print(f"資料集快取命中（{len(fingerprint)} 期），耗時 {elapsed:.1f} ms")
+                return self.combined
+
+            cold = self.combined is None
+            for season_code in removed:
+                self.parts.pop(season_code, None)
+            for season_code in changed:
+                self.parts[season_code] = load_season(season_code, self.root, self.columns)
+
+            appended_only = not removed and all(s not in self.fingerprint for s in changed)
+            if cold or not appended_only:
+                frames = [self.parts[s] for s in sorted(self.parts)]
+            else:
+                frames = [self.combined] + [self.parts[s] for s in sorted(changed)]
+            if frames:
+                self.combined = compact_frame(pd.concat(frames, ignore_index=True))
+            else:
+                self.combined = pd.DataFrame(columns=self.columns or [])
+            self.fingerprint = fingerprint
+            self.version += 1
+
+            elapsed = (time.perf_counter() - started) * 1000
+            label = "冷啟動載入" if cold else f"增量更新 {len(changed)} 期、移除 {len(removed)} 期"
+            print(f"資料集{label}（{len(fingerprint)} 期），耗時 {elapsed:.1f} ms")
+            return self.combined
@@ -1,57 +1,126 @@
 import os
 import re
-import requests
+import json
+import time
+from modules import http_client
 from bs4 import BeautifulSoup
 
-def get_local_periods(folder="./"):
+# 線上期數清單的磁碟快取，以及本地期數的清單
+PERIODS_CACHE_PATH = "./data/moi_periods_cache.json"
+LOCAL_MANIFEST_PATH = "./data/local_periods_manifest.json"
+PERIODS_CACHE_TTL = 6 * 60 * 60  # 秒
+
+def _read_json(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_json(path, data):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def get_local_periods(folder="./", manifest_path=LOCAL_MANIFEST_PATH):
+    """
+    本地已有的期數。清單記錄在 manifest 中，
+    只有資料夾的修改時間改變（有檔案新增或刪除）時才重新掃描資料夾。
+    """
+    key = os.path.abspath(folder)
+    mtime_ns = os.stat(folder).st_mtime_ns
+    manifest = _read_json(manifest_path) or {}
+    entry = manifest.get(key)
+    if entry and entry.get("mtime_ns") == mtime_ns:
+        return entry["periods"]
+
     pattern = re.compile(r"合併後不動產統計_(\d{5})\.csv")
     periods = []
     for fname in os.listdir(folder):
         match = pattern.match(fname)
         if match:
             periods.append(match.group(1))
+    periods = sorted(periods)
+
+    manifest[key] = {"mtime_ns": mtime_ns, "periods": periods}
+    try:
+        _write_json(manifest_path, manifest)
+    except OSError as e:
+        print(f"無法寫入本地期數清單: {e}")
+    return periods
+
+def parse_periods_html(html):
+    """從內政部下載頁的 HTML 中取出期數（5 碼格式）"""
+    # 提取季度選項
+    pattern = r'<option[^>]*value=["\']([^"\']*\d+S\d+[^"\']*)["\'[^>]*>([^<]*\d+年第\d+季[^<]*)</option>'
+    matches = re.findall(pattern, html, re.IGNORECASE)
+
+    if not matches:
+        # 備用模式
+        pattern2 = r'<option[^>]*value=["\']([^"\']*S\d+[^"\']*)["\'[^>]*>([^<]*季[^<]*)</option>'
+        matches = re.findall(pattern2, html, re.IGNORECASE)
+
+    periods = []
+    for value, text in matches:
+        # 解析季度代碼，如 "114S2" -> "11402"
+        match = re.match(r"(\d{3})S([1-4])", value)
+        if match:
+            year = match.group(1)
+            season = match.group(2)
+            periods.append(f"{year}0{season}")  # 轉成 5碼格式
+
     return sorted(periods)
 
-def get_available_periods_from_moi():
-    """從內政部網站獲取可用的期數"""
+def get_available_periods_from_moi(ttl=PERIODS_CACHE_TTL, cache_path=PERIODS_CACHE_PATH):
+    """
+    從內政部網站獲取可用的期數。
+    結果快取在磁碟上，ttl 秒內直接使用快取；過期後帶 ETag / Last-Modified
+    發出條件式請求，伺服器回 304 時沿用快取內容。
+    """
+    cache = _read_json(cache_path) or {}
+    if cache.get("periods") and time.time() - cache.get("fetched_at", 0) < ttl:
+        return cache["periods"]
+
     url = "https://plvr.land.moi.gov.tw/DownloadSeason_ajax_list"
     headers = {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
         'X-Requested-With': 'XMLHttpRequest',
         'Referer': 'https://plvr.land.moi.gov.tw/DownloadOpenData'
     }
-    
+    if cache.get("periods"):
+        if cache.get("etag"):
+            headers['If-None-Match'] = cache["etag"]
+        if cache.get("last_modified"):
+            headers['If-Modified-Since'] = cache["last_modified"]
+
     try:
-        response = requests.get(url, headers=headers, timeout=10)
-        if response.status_code != 200:
+        response = http_client.get(url, headers=headers, timeout=10)
+        if response.status_code == 304:
+            periods = cache["periods"]
+        elif response.status_code == 200:
+            periods = parse_periods_html(response.text)
+            if not periods:
+                # 解析不到期數時不要覆蓋原本的快取
+                return cache.get("periods", [])
+            cache["etag"] = response.headers.get("ETag")
+            cache["last_modified"] = response.headers.get("Last-Modified")
+        else:
             print(f"請求失敗，狀態碼: {response.status_code}")
-            return []
-        
-        html = response.text
-        
-        # 提取季度選項
-        pattern = r'<option[^>]*value=["\']([^"\']*\d+S\d+[^"\']*)["\'[^>]*>([^<]*\d+年第\d+季[^<]*)</option>'
-        matches = re.findall(pattern, html, re.IGNORECASE)
-        
-        if not matches:
-            # 備用模式
-            pattern2 = r'<option[^>]*value=["\']([^"\']*S\d+[^"\']*)["\'[^>]*>([^<]*季[^<]*)</option>'
-            matches = re.findall(pattern2, html, re.IGNORECASE)
-        
-        periods = []
-        for value, text in matches:
-            # 解析季度代碼，如 "114S2" -> "11402"
-            match = re.match(r"(\d{3})S([1-4])", value)
-            if match:
-                year = match.group(1)
-                season = match.group(2)
-                periods.append(f"{year}0{season}")  # 轉成 5碼格式
-        
-        return sorted(periods)
-        
+            return cache.get("periods", [])
+
+        cache["periods"] = periods
+        cache["fetched_at"] = time.time()
+        try:
+            _write_json(cache_path, cache)
+        except OSError as e:
+            print(f"無法寫入期數快取: {e}")
+        return periods
+
     except Exception as e:
         print(f"獲取線上期數失敗: {e}")
-        return []
+        return cache.get("periods", [])
 
 def find_missing_periods(local_periods, web_periods):
     """找出缺少的期數"""
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 讓測試可以 from modules import ...（與在專案根目錄執行 Streamlit 時相同）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,84 @@
+import pandas as pd
+import pytest
+
+from modules import http_client
+from modules.batch_geocode import geocode_listings, google_geocoder, checkpoint_path
+from modules.fake_geocoder import FakeGeocoder
+
+@pytest.fixture
+def fake(monkeypatch):
+    # 測試時不重試 503，避免退避等待
+    monkeypatch.setattr(http_client, "_session", http_client.create_session(retries=0))
+    server = FakeGeocoder()
+    server.url = server.start()
+    yield server
+    server.stop()
+
+def write_listings(path, addresses):
+    pd.DataFrame({
+        "標題": [f"物件{i}" for i in range(len(addresses))],
+        "地址": addresses,
+        "編號": [f"ID{i}" for i in range(len(addresses))],
+    }).to_csv(path, index=False, encoding="utf-8-sig")
+
+def run(fake, listings, sidecar):
+    return geocode_listings(google_geocoder("test", url=fake.url), str(listings), str(sidecar), workers=4)
+
+def test_rerun_makes_no_requests(fake, tmp_path):
+    listings, sidecar = tmp_path / "listings.csv", tmp_path / "geo.parquet"
+    # 同一路段的不同寫法只查一次
+    write_listings(listings, ["台中市西屯區台灣大道三段", "臺中市 西屯區 台灣大道三段", "台中市北區天津路二段"])
+
+    summary = run(fake, listings, sidecar)
+    assert summary["geocoded"] == 2
+    assert len(fake.requests) == 2
+    assert not (tmp_path / "geo.parquet.checkpoint.jsonl").exists()
+
+    fake.requests.clear()
+    summary = run(fake, listings, sidecar)
+    assert fake.requests == []
+    assert summary["reused"] == 2
+
+    result = pd.read_parquet(sidecar)
+    assert (result["status"] == "ok").all()
+    assert result["lat"].iloc[0] == result["lat"].iloc[1]
+
+def test_unknown_address_is_not_found(fake, tmp_path):
+    listings, sidecar = tmp_path / "listings.csv", tmp_path / "geo.parquet"
+    write_listings(listings, ["台中市北區天津路二段", "查無此路"])
+
+    run(fake, listings, sidecar)
+    result = pd.read_parquet(sidecar).set_index("地址")
+    assert result.loc["查無此路", "status"] == "not_found"
+    assert pd.isna(result.loc["查無此路", "lat"])
+
+    # 查無的地址也算查過，重跑不再查詢
+    fake.requests.clear()
+    run(fake, listings, sidecar)
+    assert fake.requests == []
+
+def test_failed_address_stays_pending_and_is_retried(fake, tmp_path):
+    listings, sidecar = tmp_path / "listings.csv", tmp_path / "geo.parquet"
+    write_listings(listings, ["台中市北區天津路二段", "逾時路一段"])
+
+    summary = run(fake, listings, sidecar)
+    assert summary["failed"] == 1
+    result = pd.read_parquet(sidecar).set_index("地址")
+    assert result.loc["逾時路一段", "status"] == "pending"
+    assert result.loc["台中市北區天津路二段", "status"] == "ok"
+
+    fake.requests.clear()
+    run(fake, listings, sidecar)
+    assert fake.requests == ["逾時路一段"]
+
+def test_checkpoint_is_resumed(fake, tmp_path):
+    listings, sidecar = tmp_path / "listings.csv", tmp_path / "geo.parquet"
+    write_listings(listings, ["台中市北區天津路二段", "台中市南區學府路"])
+    # 模擬中斷：進度檔已有一個地址，Parquet 尚未寫出
+    with open(checkpoint_path(str(sidecar)), "w", encoding="utf-8") as f:
+        f.write('{"address": "台中市北區天津路二段", "location": [24.1, 120.6]}\n')
+
+    run(fake, listings, sidecar)
+    assert fake.requests == ["台中市南區學府路"]
+    result = pd.read_parquet(sidecar).set_index("地址")
+    assert result.loc["台中市北區天津路二段", "lat"] == 24.1
@@ -0,0 +1,59 @@
+import pytest
+
+from modules import http_client
+from modules import real_estate_merger_pro as merger
+from modules.fake_github import FakeGitHub
+
+@pytest.fixture
+def fake():
+    server = FakeGitHub()
+    server.api_url = server.start()
+    yield server
+    server.stop()
+
+@pytest.fixture
+def output_files(tmp_path):
+    paths = []
+    for season in ("11401", "11402", "11403"):
+        path = tmp_path / f"合併後不動產統計_{season}.csv"
+        path.write_text(f"縣市,交易筆數\n台中市,{season}\n", encoding="utf-8")
+        paths.append(str(path))
+    return paths
+
+def publish(fake, files, message="更新統計資料"):
+    return merger.github_publish_files("owner", "repo", "main", files, message, "token", api_url=fake.api_url)
+
+def test_files_are_published_in_one_commit(fake, output_files):
+    commit_sha = publish(fake, output_files)
+
+    assert commit_sha == fake.refs["main"]
+    assert fake.commit_count() == 2  # 初始 commit + 這次發佈
+    assert sorted(fake.files()) == sorted(p.rsplit("/", 1)[-1] for p in output_files)
+
+def test_unchanged_files_make_no_commit(fake, output_files):
+    head = publish(fake, output_files)
+    fake.requests.clear()
+
+    assert publish(fake, output_files) == head
+    assert fake.commit_count() == 2
+    assert not [r for r in fake.requests if r[0] != "GET"]
+
+def test_non_fast_forward_retries_into_a_single_commit(fake, output_files, monkeypatch):
+    original_patch = http_client.patch
+    calls = []
+
+    def racing_patch(url, **kwargs):
+        # 第一次更新分支前，模擬其他人先推進了分支
+        if not calls:
+            fake.advance("main", "other.txt", b"x")
+        calls.append(url)
+        return original_patch(url, **kwargs)
+
+    monkeypatch.setattr(http_client, "patch", racing_patch)
+    commit_sha = publish(fake, output_files)
+
+    assert len(calls) == 2
+    assert commit_sha == fake.refs["main"]
+    assert fake.commit_count() == 3  # 初始 commit + 外部推送 + 這次發佈
+    assert "other.txt" in fake.files()
+    assert len(fake.files()) == len(output_files) + 1
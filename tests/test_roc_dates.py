@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from modules.real_estate_merger_pro import roc_dates_to_ages, classify_building_ages
+
+# 以 114S2（季末為民國 114 年 6 月）為基準
+SEASON = "114S2"
+
+@pytest.mark.parametrize("date, months", [
+    ("1050312", 9 * 12 + 3),   # 7 碼 年年年月月日日
+    ("850101", 29 * 12 + 5),   # 6 碼 年年月月日日
+    ("10503", 9 * 12 + 3),     # 5 碼 年年年月月
+    ("0850101", 29 * 12 + 5),  # 前導 0 的 7 碼
+    ("0050101", 109 * 12 + 5), # 前導 0 不可被當成民國 501 年
+    (" 1050312 ", 9 * 12 + 3), # 前後空白
+])
+def test_formats(date, months):
+    assert roc_dates_to_ages([date], SEASON)[0] == pytest.approx(months / 12)
+
+@pytest.mark.parametrize("date", [None, "", "abc", "105O312", "1051312", "10500", "1234", "12345678"])
+def test_invalid_values_are_nan(date):
+    assert np.isnan(roc_dates_to_ages([date], SEASON)[0])
+
+def test_same_month_is_new_not_presale():
+    ages = roc_dates_to_ages(["1140612", "11406"], SEASON)
+    assert (ages > 0).all()
+    assert list(classify_building_ages(ages)) == ["新成屋", "新成屋"]
+
+def test_future_date_is_presale():
+    ages = roc_dates_to_ages(["1140701", "11503"], SEASON)
+    assert list(ages) == [0, 0]
+    assert list(classify_building_ages(ages)) == ["預售屋", "預售屋"]